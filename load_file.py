@@ -2,6 +2,7 @@ import lxml
 from bs4 import BeautifulSoup as bs
 from collections import OrderedDict
 from no_dependent_claim import dependent_to_independent_claim
+import os
 import re
 
 
@@ -51,8 +52,20 @@ def read_patent(patent_file):
         content = file.readlines()
         # join list into string
         content = "".join(content)
-        # turn string into BeautifulSoup object
-        bs_content = bs(content, "lxml")
+
+    return parse_patent(content)
+
+
+def parse_patent(content):
+    """
+    Returns an OrderedDict for the XML content of a patent with
+    {claim_num:claim_text}
+
+    Parameters:
+        content (string): XML of a single patent.
+    """
+    # turn string into BeautifulSoup object
+    bs_content = bs(content, "lxml")
 
     all_claims_list = bs_content.find_all(
         "claim", {"id": re.compile(r'CLM-.*', re.IGNORECASE)})
@@ -80,9 +93,64 @@ def read_patent_no_dependency(patent_file):
     return dependent_to_independent_claim(read_patent(patent_file))
 
 
+def get_patent_num(content):
+    """
+    Returns the patent number without leading zeros from the
+    publication-reference of the XML content of a patent, or None if it is
+    not found.  For example, returns '8282966' for
+    '<publication-reference><document-id><country>US</country>
+    <doc-number>08282966</doc-number>...'.
+
+    Parameters:
+        content (string): XML of a single patent.
+    """
+    match = re.search(
+        r'<publication-reference>.*?<doc-number>\s*(\w+)\s*</doc-number>',
+        content, re.DOTALL)
+    if not match:
+        return None
+    return match.group(1).lstrip('0')
+
+
+def iter_patent_files(patent_files):
+    """
+    Yields (patent_num, {claim_num:claim_text}) for each patent XML file, one
+    patent at a time.  patent_num is the file name without '.xml'.
+
+    Parameters:
+        patent_files (iterable): filenames of patent XML files.
+    """
+    for patent_file in patent_files:
+        yield os.path.basename(patent_file)[:-4], read_patent(patent_file)
+
+
+def iter_bulk_patent_file(bulk_file):
+    """
+    Yields (patent_num, {claim_num:claim_text}) for each patent of a USPTO
+    bulk patent grant file, which concatenates the XML of many patents each
+    starting with '<?xml'.  The file is read line by line so that only one
+    patent is held in memory at a time.
+
+    Parameters:
+        bulk_file (string): filename of the bulk patent XML file.
+    """
+    document = []
+    with open(bulk_file, "r") as file:
+        for line in file:
+            if line.startswith("<?xml") and document:
+                content = "".join(document)
+                yield get_patent_num(content), parse_patent(content)
+                document = []
+            document.append(line)
+    if document:
+        content = "".join(document)
+        yield get_patent_num(content), parse_patent(content)
+
+
 if __name__ == '__main__':
+    from orange_book import connect, resolve_patent_files
 
-    label_sections_od = read_label("data/2007-05-04.xml")
+    label_sections_od = read_label("data/label/2007-05-04.xml")
 
     # # printout of label_sections_od
     # for title in label_sections_od.keys():
@@ -92,11 +160,26 @@ if __name__ == '__main__':
     # OrderedDict of {patent_num: {claim_num:[claim_text,...],..},...}
     patent_od = OrderedDict()
 
-    patent_files = ['8282966.xml', '8293284.xml', '8431163.xml']
+    # patents of Inomax (NDA 020845) from the Orange Book store built by
+    # orange_book.py, if it exists and lists them
+    patent_files = []
+    if os.path.exists("orange_book.db"):
+        conn = connect("orange_book.db")
+        try:
+            patent_files = resolve_patent_files(conn, ["020845"])["020845"]
+        finally:
+            conn.close()
+        if not patent_files:
+            print("No patent files of NDA 020845 in orange_book.db; "
+                  "using the default patent files")
+    if not patent_files:
+        patent_files = [
+            "data/patent/8282966.xml", "data/patent/8293284.xml",
+            "data/patent/8431163.xml"
+        ]
     for patent_file in patent_files:
-        patent_num = patent_file[:-4]
-        patent_od[patent_num] = read_patent_no_dependency("data/" +
-                                                          patent_file)
+        patent_num = os.path.basename(patent_file)[:-4]
+        patent_od[patent_num] = read_patent_no_dependency(patent_file)
 
         # printout of content of patent_od
         print("===Patent: US" + patent_num + "===")
@@ -249,3 +249,19 @@ def dependent_to_independent_claim(od):
             run_loop = False
 
     return no_dependent_od
+
+
+def iter_dependent_to_independent_claim(patents):
+    """
+    Yields (patent_num, {claim_num (int):[claim_text (str), ...], ...}) for
+    each patent in patents, wherein all dependent claims are turned
+    independent by dependent_to_independent_claim().  Each patent is only
+    expanded when it is consumed, so patents can be streamed.
+
+    Parameters:
+        patents (iterable): (patent_num, {claim_num (int): claim_text (str),
+                            ..}) for each patent, for example from
+                            load_file.iter_bulk_patent_file()
+    """
+    for patent_num, od in patents:
+        yield patent_num, dependent_to_independent_claim(od)
@@ -0,0 +1,499 @@
+#!/usr/bin/env python
+"""
+Provides for an indexed local SQLite store of the Orange Book products,
+patent and exclusivity files (see
+https://www.fda.gov/drugs/drug-approvals-and-databases/orange-book-data-files),
+together with an index of the patent XML files in data/patent/ and the DailyMed
+label versions in data/label/.  A drug, as defined by its application number,
+can then be resolved to the patent files and label versions that apply to it
+without re-scanning flat files.  In particular, these features are provided by
+load_orange_book(), resolve_patent_files() and resolve_label_files().
+
+Usage:
+    python orange_book.py orange_book.db products.txt patent.txt exclusivity.txt
+"""
+
+import argparse
+import csv
+import os
+import re
+import sqlite3
+from collections import OrderedDict
+
+# [(column, header in Orange Book file),...] for each Orange Book file
+PRODUCT_COLUMNS = [
+    ("ingredient", "Ingredient"),
+    ("df_route", "DF;Route"),
+    ("trade_name", "Trade_Name"),
+    ("applicant", "Applicant"),
+    ("strength", "Strength"),
+    ("appl_type", "Appl_Type"),
+    ("appl_no", "Appl_No"),
+    ("product_no", "Product_No"),
+    ("te_code", "TE_Code"),
+    ("approval_date", "Approval_Date"),
+    ("rld", "RLD"),
+    ("rs", "RS"),
+    ("type", "Type"),
+    ("applicant_full_name", "Applicant_Full_Name"),
+]
+
+PATENT_COLUMNS = [
+    ("appl_type", "Appl_Type"),
+    ("appl_no", "Appl_No"),
+    ("product_no", "Product_No"),
+    ("patent_no", "Patent_No"),
+    ("patent_expire_date", "Patent_Expire_Date_Text"),
+    ("drug_substance_flag", "Drug_Substance_Flag"),
+    ("drug_product_flag", "Drug_Product_Flag"),
+    ("patent_use_code", "Patent_Use_Code"),
+    ("delist_flag", "Delist_Flag"),
+    ("submission_date", "Submission_Date"),
+]
+
+EXCLUSIVITY_COLUMNS = [
+    ("appl_type", "Appl_Type"),
+    ("appl_no", "Appl_No"),
+    ("product_no", "Product_No"),
+    ("exclusivity_code", "Exclusivity_Code"),
+    ("exclusivity_date", "Exclusivity_Date"),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products ({product_columns});
+CREATE TABLE IF NOT EXISTS product_ingredients (
+    appl_no TEXT, product_no TEXT, ingredient TEXT);
+CREATE TABLE IF NOT EXISTS patents ({patent_columns});
+CREATE TABLE IF NOT EXISTS exclusivities ({exclusivity_columns});
+CREATE TABLE IF NOT EXISTS patent_files (patent_no TEXT, path TEXT);
+CREATE TABLE IF NOT EXISTS label_files (
+    set_id TEXT, version INTEGER, published_date TEXT, path TEXT);
+CREATE TABLE IF NOT EXISTS label_applications (set_id TEXT, appl_no TEXT);
+""".format(
+    product_columns=", ".join(column + " TEXT"
+                              for column, _ in PRODUCT_COLUMNS),
+    patent_columns=", ".join(column + " TEXT"
+                             for column, _ in PATENT_COLUMNS),
+    exclusivity_columns=", ".join(column + " TEXT"
+                                  for column, _ in EXCLUSIVITY_COLUMNS))
+
+# indexes are created after bulk loading, which is faster than updating them
+# for each inserted row
+INDEXES = """
+CREATE INDEX IF NOT EXISTS products_appl ON products (appl_no, product_no);
+CREATE INDEX IF NOT EXISTS product_ingredients_ingredient
+    ON product_ingredients (ingredient);
+CREATE INDEX IF NOT EXISTS patents_appl ON patents (appl_no, product_no);
+CREATE INDEX IF NOT EXISTS patents_patent_no ON patents (patent_no);
+CREATE INDEX IF NOT EXISTS exclusivities_appl
+    ON exclusivities (appl_no, product_no);
+CREATE INDEX IF NOT EXISTS patent_files_patent_no
+    ON patent_files (patent_no);
+CREATE INDEX IF NOT EXISTS label_files_set_id ON label_files (set_id);
+CREATE INDEX IF NOT EXISTS label_applications_appl_no
+    ON label_applications (appl_no);
+"""
+
+# matches the application number of a label, for example
+# '<id extension="NDA020845" root="2.16.840.1.113883.3.150"/>'
+LABEL_APPLICATION_RE = re.compile(r'extension="(?:NDA|ANDA|BLA)(\d+)"',
+                                  re.IGNORECASE)
+
+# matches a label version folder, for example
+# '20070504_762b51be-1893-4cd1-9511-e645fc420d3a'
+LABEL_FOLDER_RE = re.compile(r'^(\d{8})_([0-9a-fA-F-]+)$')
+
+
+def normalize_appl_no(appl_no):
+    """
+    Returns an application number as the 6 digit string used in the Orange
+    Book.  For example, normalize_appl_no("NDA20845") returns "020845".
+
+    Parameters:
+        appl_no (string or int): application number
+    """
+    return re.sub(r'^[A-Za-z]+', '', str(appl_no).strip()).zfill(6)
+
+
+def normalize_product_no(product_no):
+    """
+    Returns a product number as the 3 digit string used in the Orange Book.
+    For example, normalize_product_no(3) returns "003".
+
+    Parameters:
+        product_no (string or int): product number
+    """
+    return str(product_no).strip().zfill(3)
+
+
+def normalize_patent_no(patent_no):
+    """
+    Returns a patent number without country code or punctuation, as used in
+    the file names in data/patent/.  For example,
+    normalize_patent_no("US 8,431,163 B2") and
+    normalize_patent_no("8431163*PED") return "8431163".
+
+    Parameters:
+        patent_no (string or int): patent number
+    """
+    patent_no = re.sub(r'[\s,]', '', str(patent_no)).upper()
+    # drops pediatric exclusivity suffix, for example '*PED'
+    patent_no = patent_no.split('*', 1)[0]
+    patent_no = re.sub(r'^US', '', patent_no)
+    return re.sub(r'[A-Z]\d?$', '', patent_no) if re.match(
+        r'^\d', patent_no) else patent_no
+
+
+def connect(db_file):
+    """
+    Returns a sqlite3 connection to db_file, creating the tables of the store
+    if they do not exist yet.
+
+    Parameters:
+        db_file (string): filename of the SQLite database
+    """
+    conn = sqlite3.connect(db_file)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _read_orange_book_file(orange_book_file, columns):
+    """
+    Yields a tuple of column values for each row of a '~' delimited Orange
+    Book file, with application, product and patent numbers normalized.
+
+    Parameters:
+        orange_book_file (string): filename of an Orange Book text file
+        columns (list): [(column, header in Orange Book file),...]
+    """
+    with open(orange_book_file, "r", encoding="utf-8", errors="replace",
+              newline="") as file:
+        # fields are not quoted, so '"' is read as any other character
+        for row in csv.DictReader(file,
+                                  delimiter="~",
+                                  quoting=csv.QUOTE_NONE):
+            values = []
+            for column, header in columns:
+                value = (row.get(header) or "").strip()
+                if column == "appl_no":
+                    value = normalize_appl_no(value)
+                elif column == "product_no":
+                    value = normalize_product_no(value)
+                elif column == "patent_no":
+                    value = normalize_patent_no(value)
+                elif column == "ingredient":
+                    value = value.upper()
+                values.append(value)
+            yield tuple(values)
+
+
+def _insert_rows(conn, table, columns, rows):
+    """
+    Inserts all rows into table.
+
+    Parameters:
+        conn (sqlite3.Connection): connection from connect()
+        table (string): name of table
+        columns (list): [(column, header in Orange Book file),...]
+        rows (iterable): tuple of column values for each row
+    """
+    conn.executemany(
+        "INSERT INTO {} ({}) VALUES ({})".format(
+            table, ", ".join(column for column, _ in columns),
+            ", ".join("?" for _ in columns)), rows)
+
+
+def index_patent_files(conn, patent_dir="data/patent"):
+    """
+    Replaces the index of patent XML files with the files in patent_dir, each
+    being named {patent_num}.xml.
+
+    Parameters:
+        conn (sqlite3.Connection): connection from connect()
+        patent_dir (string): folder of patent XML files
+    """
+    conn.execute("DELETE FROM patent_files")
+    rows = []
+    for file_name in sorted(os.listdir(patent_dir)):
+        if file_name.lower().endswith(".xml"):
+            rows.append((normalize_patent_no(file_name[:-4]),
+                         os.path.join(patent_dir, file_name)))
+    conn.executemany("INSERT INTO patent_files VALUES (?, ?)", rows)
+
+
+def index_label_files(conn, label_dir="data/label"):
+    """
+    Replaces the index of label XML files with the files in label_dir, laid
+    out as {version}/{yyyymmdd}_{set_id}/{file}.xml as retrieved from
+    DailyMed.  A set_id is linked to every application number recited in any
+    of its versions, so that older versions without an application number are
+    still resolved.
+
+    Parameters:
+        conn (sqlite3.Connection): connection from connect()
+        label_dir (string): folder of label versions
+    """
+    conn.execute("DELETE FROM label_files")
+    conn.execute("DELETE FROM label_applications")
+    label_files = []
+    label_applications = set()
+    for version in sorted(os.listdir(label_dir)):
+        version_dir = os.path.join(label_dir, version)
+        if not version.isdigit() or not os.path.isdir(version_dir):
+            continue
+        for folder in sorted(os.listdir(version_dir)):
+            match = LABEL_FOLDER_RE.match(folder)
+            if not match:
+                continue
+            published_date, set_id = match.group(1), match.group(2).lower()
+            folder_dir = os.path.join(version_dir, folder)
+            for file_name in sorted(os.listdir(folder_dir)):
+                if not file_name.lower().endswith(".xml"):
+                    continue
+                path = os.path.join(folder_dir, file_name)
+                label_files.append((set_id, int(version), published_date,
+                                    path))
+                with open(path, "r", encoding="utf-8",
+                          errors="replace") as file:
+                    for appl_no in LABEL_APPLICATION_RE.findall(file.read()):
+                        label_applications.add(
+                            (set_id, normalize_appl_no(appl_no)))
+    conn.executemany("INSERT INTO label_files VALUES (?, ?, ?, ?)",
+                     label_files)
+    conn.executemany("INSERT INTO label_applications VALUES (?, ?)",
+                     sorted(label_applications))
+
+
+def load_orange_book(db_file,
+                     products_file,
+                     patent_file,
+                     exclusivity_file,
+                     patent_dir="data/patent",
+                     label_dir="data/label"):
+    """
+    Returns a sqlite3 connection to db_file after bulk loading the Orange Book
+    products, patent and exclusivity files, replacing any earlier load, and
+    indexing the patent and label files.
+
+    Parameters:
+        db_file (string): filename of the SQLite database
+        products_file (string): filename of Orange Book products.txt
+        patent_file (string): filename of Orange Book patent.txt
+        exclusivity_file (string): filename of Orange Book exclusivity.txt
+        patent_dir (string): folder of patent XML files
+        label_dir (string): folder of label versions
+    """
+    conn = connect(db_file)
+    # the store can be rebuilt from the source files, so durability is
+    # traded for loading speed
+    conn.execute("PRAGMA synchronous = OFF")
+    # indexes of an earlier load are dropped so that they are not updated for
+    # each deleted and inserted row
+    conn.executescript("".join(
+        "DROP INDEX IF EXISTS " + index + ";\n"
+        for index in re.findall(r'CREATE INDEX IF NOT EXISTS (\w+)', INDEXES)))
+    with conn:
+        for table in ("products", "product_ingredients", "patents",
+                      "exclusivities"):
+            conn.execute("DELETE FROM " + table)
+        _insert_rows(conn, "products", PRODUCT_COLUMNS,
+                     _read_orange_book_file(products_file, PRODUCT_COLUMNS))
+        # combination products recite ingredients as 'A; B'
+        conn.executemany(
+            "INSERT INTO product_ingredients VALUES (?, ?, ?)",
+            ((row["appl_no"], row["product_no"], ingredient.strip())
+             for row in conn.execute(
+                 "SELECT appl_no, product_no, ingredient FROM products").
+             fetchall() for ingredient in row["ingredient"].split(";")
+             if ingredient.strip()))
+        _insert_rows(conn, "patents", PATENT_COLUMNS,
+                     _read_orange_book_file(patent_file, PATENT_COLUMNS))
+        _insert_rows(
+            conn, "exclusivities", EXCLUSIVITY_COLUMNS,
+            _read_orange_book_file(exclusivity_file, EXCLUSIVITY_COLUMNS))
+        if patent_dir:
+            index_patent_files(conn, patent_dir)
+        if label_dir:
+            index_label_files(conn, label_dir)
+    # executescript() commits first, so indexes are created after the
+    # transaction above rather than partway through it
+    conn.executescript(INDEXES)
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA synchronous = FULL")
+    return conn
+
+
+def _find(conn, table, conditions):
+    """
+    Returns a list of dict for each row of table matching all conditions.
+
+    Parameters:
+        conn (sqlite3.Connection): connection from connect()
+        table (string): name of table
+        conditions (list): [(column, value),...]; None values are ignored
+    """
+    conditions = [(column, value) for column, value in conditions
+                  if value is not None]
+    query = "SELECT * FROM " + table
+    if conditions:
+        query += " WHERE " + " AND ".join(column + " = ?"
+                                          for column, _ in conditions)
+    return [
+        dict(row)
+        for row in conn.execute(query, [value for _, value in conditions])
+    ]
+
+
+def find_products(conn, appl_no=None, product_no=None, ingredient=None):
+    """
+    Returns a list of dict for each product in the Orange Book matching all of
+    the given application number, product number and ingredient.  A
+    combination product matches each of its ingredients.
+
+    Parameters:
+        conn (sqlite3.Connection): connection from connect()
+        appl_no (string): application number, for example "020845"
+        product_no (string): product number, for example "003"
+        ingredient (string): active ingredient, for example "NITRIC OXIDE"
+    """
+    if ingredient is None:
+        return _find(conn, "products", [
+            ("appl_no", appl_no and normalize_appl_no(appl_no)),
+            ("product_no", product_no and normalize_product_no(product_no)),
+        ])
+    conditions = [("i.ingredient = ?", ingredient.strip().upper())]
+    if appl_no is not None:
+        conditions.append(("p.appl_no = ?", normalize_appl_no(appl_no)))
+    if product_no is not None:
+        conditions.append(
+            ("p.product_no = ?", normalize_product_no(product_no)))
+    query = """
+        SELECT DISTINCT p.* FROM product_ingredients i
+        JOIN products p
+            ON p.appl_no = i.appl_no AND p.product_no = i.product_no
+        WHERE """ + " AND ".join(condition for condition, _ in conditions)
+    return [
+        dict(row)
+        for row in conn.execute(query, [value for _, value in conditions])
+    ]
+
+
+def find_patents(conn, appl_no=None, product_no=None, patent_no=None):
+    """
+    Returns a list of dict for each patent listing in the Orange Book matching
+    all of the given application number, product number and patent number.
+
+    Parameters:
+        conn (sqlite3.Connection): connection from connect()
+        appl_no (string): application number, for example "020845"
+        product_no (string): product number, for example "003"
+        patent_no (string): patent number, for example "8431163"
+    """
+    return _find(conn, "patents", [
+        ("appl_no", appl_no and normalize_appl_no(appl_no)),
+        ("product_no", product_no and normalize_product_no(product_no)),
+        ("patent_no", patent_no and normalize_patent_no(patent_no)),
+    ])
+
+
+def find_exclusivities(conn, appl_no=None, product_no=None):
+    """
+    Returns a list of dict for each exclusivity in the Orange Book matching
+    all of the given application number and product number.
+
+    Parameters:
+        conn (sqlite3.Connection): connection from connect()
+        appl_no (string): application number, for example "020845"
+        product_no (string): product number, for example "003"
+    """
+    return _find(conn, "exclusivities", [
+        ("appl_no", appl_no and normalize_appl_no(appl_no)),
+        ("product_no", product_no and normalize_product_no(product_no)),
+    ])
+
+
+def _resolve(conn, appl_nos, query):
+    """
+    Returns an OrderedDict of {appl_no: [value,...],...} for a query joining
+    the temporary table resolve_appl_nos, which holds appl_nos, and selecting
+    (appl_no, value) pairs.
+
+    Parameters:
+        conn (sqlite3.Connection): connection from connect()
+        appl_nos (iterable): application numbers
+        query (string): SQL query
+    """
+    return_od = OrderedDict(
+        (normalize_appl_no(appl_no), []) for appl_no in appl_nos)
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS resolve_appl_nos (appl_no TEXT)")
+    # the transaction opened by the INSERT is ended on leaving the block, so
+    # no lock is kept on the store after resolving
+    with conn:
+        conn.execute("DELETE FROM resolve_appl_nos")
+        conn.executemany("INSERT INTO resolve_appl_nos VALUES (?)",
+                         ((appl_no, ) for appl_no in return_od.keys()))
+        for appl_no, value in conn.execute(query):
+            return_od[appl_no].append(value)
+        conn.execute("DELETE FROM resolve_appl_nos")
+    return return_od
+
+
+def resolve_patent_files(conn, appl_nos):
+    """
+    Returns an OrderedDict of {appl_no: [patent_file,...],...} of the patent
+    XML files listed in the Orange Book for each application number, sorted by
+    patent number.  All application numbers are resolved with a single
+    indexed query.
+
+    Parameters:
+        conn (sqlite3.Connection): connection from connect()
+        appl_nos (iterable): application numbers, for example ["020845"]
+    """
+    return _resolve(
+        conn, appl_nos, """
+        SELECT DISTINCT r.appl_no, f.path FROM resolve_appl_nos r
+        JOIN patents p ON p.appl_no = r.appl_no
+        JOIN patent_files f ON f.patent_no = p.patent_no
+        ORDER BY r.appl_no, f.patent_no, f.path""")
+
+
+def resolve_label_files(conn, appl_nos):
+    """
+    Returns an OrderedDict of {appl_no: [label_file,...],...} of every label
+    version file for each application number, sorted by set_id and version.
+    All application numbers are resolved with a single indexed query.
+
+    Parameters:
+        conn (sqlite3.Connection): connection from connect()
+        appl_nos (iterable): application numbers, for example ["020845"]
+    """
+    return _resolve(
+        conn, appl_nos, """
+        SELECT DISTINCT r.appl_no, f.path FROM resolve_appl_nos r
+        JOIN label_applications a ON a.appl_no = r.appl_no
+        JOIN label_files f ON f.set_id = a.set_id
+        ORDER BY r.appl_no, f.set_id, f.version, f.path""")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Bulk load the Orange Book into a local SQLite store.")
+    parser.add_argument("db_file", help="SQLite database to create")
+    parser.add_argument("products_file", help="Orange Book products.txt")
+    parser.add_argument("patent_file", help="Orange Book patent.txt")
+    parser.add_argument("exclusivity_file",
+                        help="Orange Book exclusivity.txt")
+    parser.add_argument("--patent_dir", default="data/patent")
+    parser.add_argument("--label_dir", default="data/label")
+    args = parser.parse_args()
+
+    conn = load_orange_book(args.db_file, args.products_file,
+                            args.patent_file, args.exclusivity_file,
+                            args.patent_dir, args.label_dir)
+    for table in ("products", "patents", "exclusivities", "patent_files",
+                  "label_files"):
+        print(table + ": " +
+              str(conn.execute("SELECT COUNT(*) FROM " + table).fetchone()[0]))
+    conn.close()
@@ -1,14 +1,16 @@
-import scispacy
-import spacy
+import heapq
+import os
+import tempfile
+from itertools import islice
+import numpy as np
 from load_file import read_label, read_patent, read_patent_no_dependency
 from collections import OrderedDict
 
-# load scispaCy models
-en_core_sci_lg_nlp = spacy.load(
-    "en_core_sci_lg-0.4.0/en_core_sci_lg/en_core_sci_lg-0.4.0")
-# removing bert for the time being; this pretrained model is very slow.
-# en_core_sci_scibert_nlp = spacy.load(
-#     "en_core_sci_scibert-0.4.0/en_core_sci_scibert/en_core_sci_scibert-0.4.0/")
+# number of vectors quantized or dequantized at a time
+_QUANTIZE_CHUNK_SIZE = 65536
+
+# slack added to quantization error bounds for float32 rounding in dot products
+_SCORE_TOLERANCE = 1e-4
 
 # cache for nlp object each consisting of [string, nlp_object]
 string_nlp_list1 = [""] * 2
@@ -54,12 +56,12 @@ def label_section_to_patent_claim_similarity(labels_section_od,
     '''
     # print(patent_od_no_dependency)
     return_od = OrderedDict()
-    for title in label_sections_od.keys():
-        section_text = label_sections_od[title]
+    for title in labels_section_od.keys():
+        section_text = labels_section_od[title]
         if section_text:
             patent_claim_similarity_list = []
-            for patent_num in patent_od.keys():
-                for claim_num in patent_od[patent_num].keys():
+            for patent_num in patent_od_no_dependency.keys():
+                for claim_num in patent_od_no_dependency[patent_num].keys():
                     similarity_highest = 0
                     for claim_text in patent_od_no_dependency[patent_num][
                             claim_num]:
@@ -79,6 +81,1089 @@ def label_section_to_patent_claim_similarity(labels_section_od,
     return return_od
 
 
+def collect_unique_texts(labels_section_od, patent_od_no_dependency):
+    '''
+    Returns a list of every unique non-empty section_text and claim_text, in
+    the order first seen, so that each text is only embedded once per model.
+
+    Parameters:
+        labels_section_od (OrderedDict): {section_title:section_text,...}
+        patent_od_no_dependency (OrderedDict): {patent_num: {claim_num:
+                                                [claim_text, ...], ..}, ...}
+    '''
+    # a dict is used as an insertion ordered set
+    unique_texts = OrderedDict()
+    for section_text in labels_section_od.values():
+        if section_text:
+            unique_texts[section_text] = None
+    for claims_od in patent_od_no_dependency.values():
+        for claim_text_list in claims_od.values():
+            for claim_text in claim_text_list:
+                unique_texts[claim_text] = None
+    return list(unique_texts.keys())
+
+
+def _tokenizer_key(method):
+    '''
+    Returns the serialized tokenizer of a model, or None if it cannot be
+    serialized.  Models with equal keys tokenize text identically.
+
+    Parameters:
+        method (object): the model loaded by spaCy.load()
+    '''
+    try:
+        return method.tokenizer.to_bytes(exclude=["vocab"])
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _run_pipeline(method, docs, batch_size):
+    '''
+    Returns an iterator of docs after running already tokenized docs through
+    every pipeline component of method, batching where the component allows.
+
+    Parameters:
+        method (object): the model loaded by spaCy.load()
+        docs (iterable): spaCy Doc objects created with method.vocab
+        batch_size (int): number of docs per batch
+    '''
+    for _, proc in method.pipeline:
+        if hasattr(proc, "pipe"):
+            docs = proc.pipe(docs, batch_size=batch_size)
+        else:
+            docs = map(proc, docs)
+    return docs
+
+
+def _docs_to_unit_vectors(docs, count):
+    '''
+    Returns a numpy array of shape (count, vector_width) of L2 normalized
+    doc vectors.  Docs without a vector are left as zero rows, so their cosine
+    similarity is 0 just as with Doc.similarity().
+
+    Parameters:
+        docs (iterable): spaCy Doc objects
+        count (int): number of docs in docs
+    '''
+    vectors = None
+    for i, doc in enumerate(docs):
+        vector = np.asarray(doc.vector, dtype=np.float32)
+        if vectors is None:
+            vectors = np.zeros((count, vector.shape[0]), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vectors[i] = vector / norm
+    if vectors is None:
+        vectors = np.zeros((count, 0), dtype=np.float32)
+    return vectors
+
+
+def _iter_model_doc_batches(texts, methods, batch_size):
+    '''
+    Yields (start, docs_od) for consecutive batches of batch_size texts,
+    wherein docs_od is an OrderedDict of {model_name: [doc,...],...} of
+    texts[start:start + batch_size] processed by each model.  Models that
+    share a tokenizer (for example, en_core_sci_lg and en_core_sci_scibert
+    both use the scispaCy tokenizer) only tokenize each batch once; each model
+    then runs its own pipeline over the tokens of the batch, so only one batch
+    of tokens and docs is held at a time.
+
+    Parameters:
+        texts (list): list of strings to embed
+        methods (OrderedDict): {model_name: model loaded by spaCy.load(),...}
+        batch_size (int): number of texts per batch
+    '''
+    # group model names by tokenizer so texts are tokenized once per group
+    tokenizer_groups = OrderedDict()
+    for model_name, method in methods.items():
+        key = _tokenizer_key(method)
+        if key is None:
+            key = model_name
+        tokenizer_groups.setdefault(key, []).append(model_name)
+
+    # one lazy stream of docs, or of tokenized docs, per group
+    group_streams = []
+    for model_names in tokenizer_groups.values():
+        method = methods[model_names[0]]
+        if len(model_names) == 1:
+            stream = method.pipe(texts, batch_size=batch_size)
+        else:
+            stream = method.tokenizer.pipe(texts, batch_size=batch_size)
+        group_streams.append((model_names, stream))
+
+    for start in range(0, len(texts), batch_size):
+        docs_od = OrderedDict()
+        for model_names, stream in group_streams:
+            batch = list(islice(stream, batch_size))
+            if len(model_names) == 1:
+                docs_od[model_names[0]] = batch
+                continue
+
+            from spacy.tokens import Doc
+
+            # tokens are kept as (words, spaces) so they can be rebuilt on
+            # every model's vocab
+            tokens = [([token.text for token in doc],
+                       [bool(token.whitespace_) for token in doc])
+                      for doc in batch]
+            for model_name in model_names:
+                method = methods[model_name]
+                docs = (Doc(method.vocab, words=words, spaces=spaces)
+                        for words, spaces in tokens)
+                docs_od[model_name] = list(
+                    _run_pipeline(method, docs, batch_size))
+
+        # keep the order of methods
+        yield start, OrderedDict(
+            (model_name, docs_od[model_name]) for model_name in methods)
+
+
+def embed_texts(texts, methods, batch_size=64):
+    '''
+    Returns an OrderedDict of {model_name: vectors,...} wherein vectors is a
+    numpy array of L2 normalized doc vectors with one row per text.  Texts
+    are tokenized once for models that share a tokenizer.
+
+    Parameters:
+        texts (list): list of strings to embed
+        methods (OrderedDict): {model_name: model loaded by spaCy.load(),...}
+        batch_size (int): number of texts per batch
+    '''
+    vectors_od = OrderedDict(
+        (model_name, np.zeros((0, 0), dtype=np.float32))
+        for model_name in methods)
+    for start, docs_od in _iter_model_doc_batches(texts, methods, batch_size):
+        for model_name, docs in docs_od.items():
+            chunk = _docs_to_unit_vectors(docs, len(docs))
+            if start == 0:
+                vectors_od[model_name] = np.zeros(
+                    (len(texts), chunk.shape[1]), dtype=np.float32)
+            vectors_od[model_name][start:start + len(docs)] = chunk
+    return vectors_od
+
+
+def _claim_layout(patent_od_no_dependency, text_index):
+    '''
+    Returns (claim_keys, claim_bounds, claim_rows), wherein claim_keys is a
+    list of (patent_num, claim_num), claim_rows is a list of the rows in
+    vectors of every alternative claim_text, and claim_bounds is a list of the
+    [start, end) positions in claim_rows of the alternatives of each claim.
+
+    Parameters:
+        patent_od_no_dependency (OrderedDict): {patent_num: {claim_num:
+                                                [claim_text, ...], ..}, ...}
+        text_index (dict): {text: row of text in vectors,...}
+    '''
+    claim_keys = []
+    claim_bounds = []
+    claim_rows = []
+    for patent_num, claims_od in patent_od_no_dependency.items():
+        for claim_num, claim_text_list in claims_od.items():
+            start = len(claim_rows)
+            claim_rows.extend(text_index[text] for text in claim_text_list)
+            claim_keys.append((patent_num, claim_num))
+            claim_bounds.append((start, len(claim_rows)))
+    return claim_keys, claim_bounds, claim_rows
+
+
+def label_section_to_patent_claim_similarity_from_vectors(
+        labels_section_od, patent_od_no_dependency, vectors, text_index):
+    '''
+    Returns OrderedDict of {section_title:[(patent_num, claim_num,
+    similarity_score),...],...} in the same form as
+    label_section_to_patent_claim_similarity(), but computed from precomputed
+    unit vectors instead of calling a model for each pair of texts.  vectors
+    are read in chunks, so they may be memory mapped.
+
+    Parameters:
+        labels_section_od (OrderedDict): {section_title:section_text,...}
+        patent_od_no_dependency (OrderedDict): {patent_num: {claim_num:
+                                                [claim_text, ...], ..}, ...}
+        vectors (numpy array): L2 normalized vectors from embed_texts()
+        text_index (dict): {text: row of text in vectors,...}
+    '''
+    claim_keys, claim_bounds, claim_rows = _claim_layout(
+        patent_od_no_dependency, text_index)
+    claim_rows = np.asarray(claim_rows, dtype=np.intp)
+    starts = np.array([start for start, _ in claim_bounds], dtype=np.intp)
+    nonempty = np.array([end > start for start, end in claim_bounds],
+                        dtype=bool)
+
+    return_od = OrderedDict()
+    for title, section_text in labels_section_od.items():
+        if section_text:
+            query = np.asarray(vectors[text_index[section_text]],
+                               dtype=np.float32)
+            # choose highest similarity value among alternative claim_texts
+            similarities = _claim_max(
+                _chunked_similarities(vectors, query)[claim_rows], starts,
+                nonempty)
+            patent_claim_similarity_list = [
+                (patent_num, claim_num, similarity)
+                for (patent_num, claim_num), similarity in zip(
+                    claim_keys, similarities.tolist())
+            ]
+            # sort by similarity value
+            patent_claim_similarity_list.sort(key=lambda x: x[2], reverse=True)
+            return_od[title] = patent_claim_similarity_list
+        else:
+            return_od[title] = []
+    return return_od
+
+
+def quantize_vectors(vectors, dtype="int8"):
+    '''
+    Returns (quantized, scales, errors) to store L2 normalized vectors in less
+    memory than float32.
+
+    With dtype="float16", quantized is the vectors cast to float16 and scales
+    is None.  With dtype="int8", each vector is scaled so that its largest
+    absolute element becomes 127, and scales holds the float32 scale of each
+    vector.  errors holds the float32 L2 norm of the difference between each
+    vector and its quantized form, which bounds the similarity error of that
+    vector against any unit vector.
+
+    Parameters:
+        vectors (numpy array): L2 normalized vectors from embed_texts()
+        dtype (string): "float16" or "int8"
+    '''
+    if dtype not in ("float16", "int8"):
+        raise ValueError("dtype must be 'float16' or 'int8', not %r" % dtype)
+    quantized = np.empty(vectors.shape, dtype=dtype)
+    scales = None
+    if dtype == "int8":
+        scales = np.empty(len(vectors), dtype=np.float32)
+    errors = np.empty(len(vectors), dtype=np.float32)
+
+    # quantize in chunks so that temporary float32 arrays stay small
+    for start in range(0, len(vectors), _QUANTIZE_CHUNK_SIZE):
+        end = start + _QUANTIZE_CHUNK_SIZE
+        chunk = np.asarray(vectors[start:end], dtype=np.float32)
+        if dtype == "float16":
+            quantized[start:end] = chunk
+            restored = quantized[start:end].astype(np.float32)
+        else:
+            chunk_scales = np.abs(chunk).max(axis=1, initial=0) / 127
+            chunk_scales[chunk_scales == 0] = 1
+            quantized[start:end] = np.round(chunk / chunk_scales[:, None])
+            scales[start:end] = chunk_scales
+            restored = quantized[start:end] * chunk_scales[:, None]
+        errors[start:end] = np.linalg.norm(chunk - restored, axis=1)
+    return quantized, scales, errors
+
+
+def _open_quantized_vectors(count, width, dtype, vectors_file):
+    '''
+    Returns (quantized_vectors, full_vectors) for count vectors of width,
+    wherein quantized_vectors is (quantized, scales, errors) as from
+    quantize_vectors() and full_vectors is a float32 .npy file vectors_file
+    memory mapped for writing, all to be filled by
+    _write_quantized_vectors().
+
+    Parameters:
+        count (int): number of vectors
+        width (int): number of elements of each vector
+        dtype (string): "float16" or "int8"
+        vectors_file (string): filename of the .npy file to write
+    '''
+    full_vectors = np.lib.format.open_memmap(vectors_file,
+                                             mode="w+",
+                                             dtype=np.float32,
+                                             shape=(count, width))
+    scales = None
+    if dtype == "int8":
+        scales = np.empty(count, dtype=np.float32)
+    quantized_vectors = (np.empty((count, width), dtype=dtype), scales,
+                         np.empty(count, dtype=np.float32))
+    return quantized_vectors, full_vectors
+
+
+def _write_quantized_vectors(vectors, start, chunk):
+    '''
+    Quantizes the L2 normalized vectors chunk with quantize_vectors() and
+    writes them, and their float32 values, from row start of vectors.
+
+    Parameters:
+        vectors (tuple): (quantized_vectors, full_vectors) from
+                        _open_quantized_vectors()
+        start (int): row of the first vector of chunk
+        chunk (numpy array): L2 normalized float32 vectors
+    '''
+    (quantized, scales, errors), full_vectors = vectors
+    end = start + len(chunk)
+    full_vectors[start:end] = chunk
+    chunk_quantized, chunk_scales, chunk_errors = quantize_vectors(
+        chunk, quantized.dtype.name)
+    quantized[start:end] = chunk_quantized
+    if scales is not None:
+        scales[start:end] = chunk_scales
+    errors[start:end] = chunk_errors
+
+
+def embed_texts_quantized(texts, methods, dtype, vectors_dir, batch_size=64):
+    '''
+    Returns an OrderedDict of {model_name: (quantized_vectors,
+    full_vectors),...} as embed_texts() would, wherein quantized_vectors is
+    (quantized, scales, errors) as from quantize_vectors() and full_vectors
+    are the L2 normalized float32 vectors saved as {model_name}.npy in
+    vectors_dir and memory mapped read only.  Each batch of texts is
+    embedded, quantized and written before the next is read, so no float32
+    matrix of all texts is held in memory.
+
+    Parameters:
+        texts (list): list of strings to embed
+        methods (OrderedDict): {model_name: model loaded by spaCy.load(),...}
+        dtype (string): "float16" or "int8"
+        vectors_dir (string): directory to save float32 vectors in
+        batch_size (int): number of texts per batch
+    '''
+    if dtype not in ("float16", "int8"):
+        raise ValueError("dtype must be 'float16' or 'int8', not %r" % dtype)
+    vectors_od = OrderedDict()
+    for start, docs_od in _iter_model_doc_batches(texts, methods, batch_size):
+        for model_name, docs in docs_od.items():
+            chunk = _docs_to_unit_vectors(docs, len(docs))
+            if start == 0:
+                vectors_od[model_name] = _open_quantized_vectors(
+                    len(texts), chunk.shape[1], dtype,
+                    os.path.join(vectors_dir, model_name + ".npy"))
+            _write_quantized_vectors(vectors_od[model_name], start, chunk)
+
+    return_od = OrderedDict()
+    for model_name in methods:
+        if model_name not in vectors_od:
+            return_od[model_name] = (quantize_vectors(
+                np.zeros((0, 0), dtype=np.float32),
+                dtype), np.zeros((0, 0), dtype=np.float32))
+            continue
+        quantized_vectors, full_vectors = vectors_od.pop(model_name)
+        full_vectors.flush()
+        del full_vectors
+        return_od[model_name] = (quantized_vectors,
+                                 np.load(os.path.join(vectors_dir,
+                                                      model_name + ".npy"),
+                                         mmap_mode="r"))
+    return return_od
+
+
+def _chunked_similarities(vectors, query, scales=None):
+    '''
+    Returns a float32 numpy array of the dot product of query with each of
+    vectors, multiplied by scales if given.  vectors are converted to float32
+    a chunk at a time, so no float32 copy of vectors is held in memory.  The
+    dot product of a row does not depend on the other rows given, so rows
+    re-scored on their own get exactly the score of a full scan.
+
+    Parameters:
+        vectors (numpy array): float32, float16 or int8 vectors, possibly
+                               memory mapped
+        query (numpy array): L2 normalized float32 vector
+        scales (numpy array): scale of each vector, or None
+    '''
+    similarities = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), _QUANTIZE_CHUNK_SIZE):
+        end = start + _QUANTIZE_CHUNK_SIZE
+        # a matrix product may round each row differently depending on the
+        # number of rows, whereas each row of sum() is summed the same way
+        similarities[start:end] = (np.asarray(vectors[start:end],
+                                              dtype=np.float32) *
+                                   query).sum(axis=1)
+        if scales is not None:
+            similarities[start:end] *= scales[start:end]
+    return similarities
+
+
+def quantized_similarities(quantized_vectors, query):
+    '''
+    Returns a float32 numpy array of the approximate cosine similarity between
+    query and each vector of quantized_vectors.
+
+    Parameters:
+        quantized_vectors (tuple): (quantized, scales, errors) from
+                                   quantize_vectors()
+        query (numpy array): L2 normalized float32 vector
+    '''
+    quantized, scales, _ = quantized_vectors
+    return _chunked_similarities(quantized, query, scales)
+
+
+def _claim_max(values, starts, nonempty):
+    '''
+    Returns a float32 numpy array with, for each claim, the highest of values
+    among its alternative claim_texts, never less than 0 as in
+    label_section_to_patent_claim_similarity().  If values holds a row of
+    values for each claim_text, a row is returned for each claim.
+
+    Parameters:
+        values (numpy array): one value, or row of values, per row of
+                              claim_rows
+        starts (numpy array): start position in claim_rows of each claim
+        nonempty (numpy array): True for each claim with alternatives
+    '''
+    result = np.zeros((len(starts), ) + values.shape[1:], dtype=np.float32)
+    if nonempty.any():
+        result[nonempty] = np.maximum.reduceat(values, starts[nonempty])
+    return np.maximum(result, 0)
+
+
+def _rerank_candidates(lower, upper, rerank_k):
+    '''
+    Returns the positions of claims that could be among the rerank_k most or
+    least similar claims given the lower and upper bounds of their similarity,
+    leaving out claims whose bounds are equal as their similarity is known.
+
+    Parameters:
+        lower, upper (numpy array): bounds of the similarity of each claim
+        rerank_k (int): number of most and least similar claims to re-score
+    '''
+    if rerank_k <= 0:
+        return np.array([], dtype=np.intp)
+    if len(lower) <= rerank_k:
+        return np.arange(len(lower))
+    # any claim whose upper bound reaches the rerank_k-th highest lower bound
+    # may be in the top rerank_k, and similarly for the bottom rerank_k
+    top_threshold = np.partition(lower, len(lower) - rerank_k)[len(lower) -
+                                                                 rerank_k]
+    bottom_threshold = np.partition(upper, rerank_k - 1)[rerank_k - 1]
+    # claims whose upper bound is clamped to 0 have a similarity of exactly 0,
+    # which may tie many claims at the bottom
+    return np.flatnonzero(((upper >= top_threshold) |
+                           (lower <= bottom_threshold)) & (lower < upper))
+
+
+def _coarse_claim_scores(quantized_vectors, query, claim_rows, starts,
+                         nonempty):
+    '''
+    Returns (approx, lower, upper), float32 numpy arrays of the approximate
+    similarity of each claim to query and the bounds of its full precision
+    similarity.
+
+    Parameters:
+        quantized_vectors (tuple): (quantized, scales, errors) from
+                                   quantize_vectors()
+        query (numpy array): L2 normalized float32 vector
+        claim_rows (numpy array): rows of every alternative claim_text
+        starts (numpy array): start position in claim_rows of each claim
+        nonempty (numpy array): True for each claim with alternatives
+    '''
+    similarities = quantized_similarities(quantized_vectors,
+                                          query)[claim_rows]
+    errors = quantized_vectors[2][claim_rows] + _SCORE_TOLERANCE
+    return (_claim_max(similarities, starts, nonempty),
+            _claim_max(similarities - errors, starts, nonempty),
+            _claim_max(similarities + errors, starts, nonempty))
+
+
+def _rescore_claims(similarity_list, positions, full_vectors, query,
+                    claim_rows, claim_bounds):
+    '''
+    Sets similarity_list[i] for each claim position i in positions to its
+    full precision similarity, computed exactly as in
+    label_section_to_patent_claim_similarity_from_vectors().
+
+    Parameters:
+        similarity_list (list): similarity of each claim
+        positions (iterable): positions of the claims to re-score
+        full_vectors (numpy array): L2 normalized float32 vectors, possibly
+                                    memory mapped
+        query (numpy array): L2 normalized float32 vector
+        claim_rows (numpy array): rows of every alternative claim_text
+        claim_bounds (list): [start, end) positions in claim_rows of the
+                             alternatives of each claim
+    '''
+    # claims without alternatives keep their similarity of 0
+    positions = [
+        i for i in positions if claim_bounds[i][1] > claim_bounds[i][0]
+    ]
+    if not positions:
+        return
+    rows = np.concatenate(
+        [claim_rows[claim_bounds[i][0]:claim_bounds[i][1]] for i in positions])
+    sizes = [claim_bounds[i][1] - claim_bounds[i][0] for i in positions]
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.intp)
+    similarities = _claim_max(
+        _chunked_similarities(np.asarray(full_vectors[rows]), query), starts,
+        np.ones(len(positions), dtype=bool))
+    for i, similarity in zip(positions, similarities.tolist()):
+        similarity_list[i] = similarity
+
+
+def _quantized_similarity_ods(labels_section_od,
+                              patent_od_no_dependency,
+                              vectors_od,
+                              text_index,
+                              fusion_weights=None,
+                              rerank_k=3):
+    '''
+    Returns an OrderedDict of {model_name: similarity_od,...} with the
+    similarity_od of label_section_to_patent_claim_similarity_quantized() for
+    each model of vectors_od, the quantized scan of each model and section
+    being done once.
+
+    If fusion_weights is given, every claim that could, within the
+    quantization error, be among the rerank_k most or least similar claims of
+    the weighted mean of the models is also re-scored with the full_vectors of
+    every model, so that combine_similarity_ods() with fusion="mean" and the
+    same weights ranks them as for full precision vectors.  The bounds of the
+    weighted mean are the weighted means of the bounds of each model.
+
+    Parameters:
+        labels_section_od (OrderedDict): {section_title:section_text,...}
+        patent_od_no_dependency (OrderedDict): {patent_num: {claim_num:
+                                                [claim_text, ...], ..}, ...}
+        vectors_od (OrderedDict): {model_name: (quantized_vectors,
+                                  full_vectors),...} from
+                                  embed_texts_quantized()
+        text_index (dict): {text: row of text in vectors,...}
+        fusion_weights (list): weight of each model, or None
+        rerank_k (int): number of most and least similar claims to re-score
+    '''
+    claim_keys, claim_bounds, claim_rows = _claim_layout(
+        patent_od_no_dependency, text_index)
+    claim_rows = np.asarray(claim_rows, dtype=np.intp)
+    starts = np.array([start for start, _ in claim_bounds], dtype=np.intp)
+    nonempty = np.array([end > start for start, end in claim_bounds],
+                        dtype=bool)
+
+    return_od = OrderedDict(
+        (model_name, OrderedDict()) for model_name in vectors_od.keys())
+    for title, section_text in labels_section_od.items():
+        if not section_text:
+            for similarity_od in return_od.values():
+                similarity_od[title] = []
+            continue
+
+        # [(query, approx, lower, upper, candidates),...] for each model
+        model_scores = []
+        for quantized_vectors, full_vectors in vectors_od.values():
+            query = np.asarray(full_vectors[text_index[section_text]],
+                               dtype=np.float32)
+            approx, lower, upper = _coarse_claim_scores(
+                quantized_vectors, query, claim_rows, starts, nonempty)
+            model_scores.append(
+                (query, approx, lower, upper,
+                 set(_rerank_candidates(lower, upper, rerank_k).tolist())))
+
+        if fusion_weights is not None:
+            weight_total = sum(fusion_weights)
+            fused_lower = sum(weight * lower for weight, (
+                _, _, lower, _, _) in zip(fusion_weights, model_scores))
+            fused_upper = sum(weight * upper for weight, (
+                _, _, _, upper, _) in zip(fusion_weights, model_scores))
+            fused_candidates = _rerank_candidates(fused_lower / weight_total,
+                                                  fused_upper / weight_total,
+                                                  rerank_k).tolist()
+            for _, _, _, _, candidates in model_scores:
+                candidates.update(fused_candidates)
+
+        for (query, approx, _, _, candidates), (
+                model_name, (_, full_vectors)) in zip(model_scores,
+                                                       vectors_od.items()):
+            similarity_list = approx.tolist()
+            _rescore_claims(similarity_list, sorted(candidates), full_vectors,
+                            query, claim_rows, claim_bounds)
+            patent_claim_similarity_list = [
+                (patent_num, claim_num, similarity)
+                for (patent_num, claim_num), similarity in zip(
+                    claim_keys, similarity_list)
+            ]
+            # sort by similarity value
+            patent_claim_similarity_list.sort(key=lambda x: x[2], reverse=True)
+            return_od[model_name][title] = patent_claim_similarity_list
+    return return_od
+
+
+def label_section_to_patent_claim_similarity_quantized(
+        labels_section_od,
+        patent_od_no_dependency,
+        quantized_vectors,
+        full_vectors,
+        text_index,
+        rerank_k=3):
+    '''
+    Returns OrderedDict of {section_title:[(patent_num, claim_num,
+    similarity_score),...],...} in the same form as
+    label_section_to_patent_claim_similarity_from_vectors(), but ranking
+    claims with quantized vectors.
+
+    Claims are first ranked by their quantized similarity.  Every claim that
+    could, within the quantization error, be among the rerank_k most or least
+    similar claims is re-scored with full_vectors, so the first and last
+    rerank_k claims of each section and their scores are identical to the
+    full precision ranking.  The similarity_score of other claims is
+    approximate.
+
+    Parameters:
+        labels_section_od (OrderedDict): {section_title:section_text,...}
+        patent_od_no_dependency (OrderedDict): {patent_num: {claim_num:
+                                                [claim_text, ...], ..}, ...}
+        quantized_vectors (tuple): (quantized, scales, errors) from
+                                   quantize_vectors()
+        full_vectors (numpy array): L2 normalized float32 vectors from
+                                    embed_texts(); may be memory mapped with
+                                    np.load(file, mmap_mode="r") as only
+                                    re-scored rows are read
+        text_index (dict): {text: row of text in vectors,...}
+        rerank_k (int): number of most and least similar claims to re-score
+    '''
+    return _quantized_similarity_ods(
+        labels_section_od,
+        patent_od_no_dependency,
+        OrderedDict([(None, (quantized_vectors, full_vectors))]),
+        text_index,
+        rerank_k=rerank_k)[None]
+
+
+def quantization_report(labels_section_od,
+                        patent_od_no_dependency,
+                        quantized_vectors,
+                        full_vectors,
+                        text_index,
+                        rerank_k=3):
+    '''
+    Returns an OrderedDict of the memory saved and ranking accuracy lost by
+    storing vectors as quantized_vectors:
+        "float32_bytes_per_million": bytes for one million claim alternatives
+                                     as float32
+        "quantized_bytes_per_million": bytes for one million claim
+                                       alternatives as quantized_vectors
+        "top_k_recall": mean fraction of the rerank_k most similar claims of
+                        each section that the quantized ranking alone finds
+        "bottom_k_recall": mean fraction of the rerank_k least similar claims
+                           of each section that the quantized ranking alone
+                           finds
+        "max_score_error": largest difference between a quantized and a full
+                           precision claim similarity
+        "rescored_fraction": mean fraction of claims re-scored at full
+                             precision by
+                             label_section_to_patent_claim_similarity_quantized()
+
+    Parameters:
+        labels_section_od (OrderedDict): {section_title:section_text,...}
+        patent_od_no_dependency (OrderedDict): {patent_num: {claim_num:
+                                                [claim_text, ...], ..}, ...}
+        quantized_vectors (tuple): (quantized, scales, errors) from
+                                   quantize_vectors()
+        full_vectors (numpy array): L2 normalized float32 vectors, which may
+                                    be memory mapped as they are read in
+                                    chunks
+        text_index (dict): {text: row of text in vectors,...}
+        rerank_k (int): number of most and least similar claims to re-score
+    '''
+    quantized, scales, errors = quantized_vectors
+    width = quantized.shape[1]
+    quantized_bytes = quantized.itemsize * width + errors.itemsize
+    if scales is not None:
+        quantized_bytes += scales.itemsize
+
+    _, claim_bounds, claim_rows = _claim_layout(patent_od_no_dependency,
+                                                text_index)
+    claim_rows = np.asarray(claim_rows, dtype=np.intp)
+    starts = np.array([start for start, _ in claim_bounds], dtype=np.intp)
+    nonempty = np.array([end > start for start, end in claim_bounds],
+                        dtype=bool)
+
+    top_recalls = []
+    bottom_recalls = []
+    rescored_fractions = []
+    max_score_error = 0.0
+    for section_text in labels_section_od.values():
+        if not section_text or not len(claim_bounds):
+            continue
+        query = np.asarray(full_vectors[text_index[section_text]],
+                           dtype=np.float32)
+        exact = _claim_max(
+            _chunked_similarities(full_vectors, query)[claim_rows], starts,
+            nonempty)
+        approx, lower, upper = _coarse_claim_scores(quantized_vectors, query,
+                                                    claim_rows, starts,
+                                                    nonempty)
+        k = min(rerank_k, len(exact))
+        if k:
+            # claims in the order they are listed, most similar first
+            exact_order = np.argsort(-exact, kind="stable")
+            approx_order = np.argsort(-approx, kind="stable")
+            top_recalls.append(
+                len(set(exact_order[:k]) & set(approx_order[:k])) / k)
+            bottom_recalls.append(
+                len(set(exact_order[-k:]) & set(approx_order[-k:])) / k)
+        rescored_fractions.append(
+            len(_rerank_candidates(lower, upper, rerank_k)) / len(exact))
+        max_score_error = max(max_score_error,
+                              float(np.abs(exact - approx).max()))
+
+    report = OrderedDict()
+    report["float32_bytes_per_million"] = 4 * width * 1000000
+    report["quantized_bytes_per_million"] = quantized_bytes * 1000000
+    report["top_k_recall"] = float(
+        np.mean(top_recalls)) if top_recalls else 1.0
+    report["bottom_k_recall"] = float(
+        np.mean(bottom_recalls)) if bottom_recalls else 1.0
+    report["max_score_error"] = max_score_error
+    report["rescored_fraction"] = float(
+        np.mean(rescored_fractions)) if rescored_fractions else 0.0
+    return report
+
+
+def _fusion_weights(model_names, weights):
+    '''
+    Returns a list of the weight of each model of model_names.
+
+    Parameters:
+        model_names (iterable): name of each model
+        weights (dict): {model_name: weight,...}; defaults to 1 for each
+                        model; weights must not be negative nor all 0
+    '''
+    if weights is None:
+        weights = {}
+    model_weights = [weights.get(model_name, 1) for model_name in model_names]
+    if any(weight < 0 for weight in model_weights):
+        raise ValueError("weights must not be negative")
+    if model_weights and not sum(model_weights) > 0:
+        raise ValueError("weights must not all be 0")
+    return model_weights
+
+
+def combine_similarity_ods(similarity_ods, weights=None, fusion="mean",
+                           rrf_k=60):
+    '''
+    Returns an OrderedDict of {section_title:[(patent_num, claim_num,
+    combined_score),...],...} sorted from highest to lowest combined_score.
+
+    With fusion="mean", combined_score is the weighted mean of the similarity
+    scores of each model.  With fusion="rank", combined_score is the weighted
+    reciprocal rank fusion sum(weight / (rrf_k + rank)), where rank starts at 1
+    for the most similar claim of each model.
+
+    Parameters:
+        similarity_ods (OrderedDict): {model_name: similarity_od,...}
+        weights (dict): {model_name: weight,...}; defaults to 1 for each
+                        model; weights must not be negative nor all 0
+        fusion (string): "mean" or "rank"
+        rrf_k (int): constant dampening the effect of top ranks for "rank"
+    '''
+    if fusion not in ("mean", "rank"):
+        raise ValueError("fusion must be 'mean' or 'rank', not %r" % fusion)
+    model_weights = list(
+        zip(similarity_ods.values(),
+            _fusion_weights(similarity_ods.keys(), weights)))
+    weight_total = sum(weight for _, weight in model_weights)
+
+    return_od = OrderedDict()
+    if not model_weights:
+        return return_od
+    for title in model_weights[0][0].keys():
+        # OrderedDict of {(patent_num, claim_num): combined_score,...}
+        scores = OrderedDict()
+        for similarity_od, weight in model_weights:
+            for rank, (patent_num, claim_num,
+                       similarity) in enumerate(similarity_od[title], 1):
+                if fusion == "mean":
+                    score = weight * similarity / weight_total
+                else:
+                    score = weight / (rrf_k + rank)
+                key = (patent_num, claim_num)
+                scores[key] = scores.get(key, 0) + score
+        combined_list = [(patent_num, claim_num, score)
+                         for (patent_num, claim_num), score in scores.items()]
+        combined_list.sort(key=lambda x: x[2], reverse=True)
+        return_od[title] = combined_list
+    return return_od
+
+
+def _quantized_model_similarity_ods(labels_section_od,
+                                    patent_od_no_dependency, texts,
+                                    text_index, methods, weights, fusion,
+                                    claim_vector_dtype, vectors_dir,
+                                    batch_size, return_report):
+    '''
+    Returns (model_similarity_od, report_od) for
+    ensemble_label_section_to_patent_claim_similarity() with quantized claim
+    vectors, wherein report_od is an OrderedDict of {model_name:
+    quantization_report(),...}, empty unless return_report is True.
+
+    Parameters:
+        see ensemble_label_section_to_patent_claim_similarity()
+    '''
+    vectors_od = embed_texts_quantized(texts, methods, claim_vector_dtype,
+                                       vectors_dir, batch_size)
+    fusion_weights = None
+    if fusion == "mean" and len(methods) > 1:
+        fusion_weights = _fusion_weights(methods.keys(), weights)
+    model_similarity_od = _quantized_similarity_ods(labels_section_od,
+                                                    patent_od_no_dependency,
+                                                    vectors_od, text_index,
+                                                    fusion_weights)
+
+    report_od = OrderedDict()
+    if return_report:
+        for model_name, (quantized_vectors,
+                         full_vectors) in vectors_od.items():
+            report_od[model_name] = quantization_report(
+                labels_section_od, patent_od_no_dependency, quantized_vectors,
+                full_vectors, text_index)
+    return model_similarity_od, report_od
+
+
+def ensemble_label_section_to_patent_claim_similarity(
+        labels_section_od,
+        patent_od_no_dependency,
+        methods,
+        weights=None,
+        fusion="mean",
+        batch_size=64,
+        claim_vector_dtype=None,
+        vectors_dir=None,
+        return_report=False):
+    '''
+    Returns (model_similarity_od, combined_similarity_od), wherein
+    model_similarity_od is an OrderedDict of {model_name: similarity_od,...},
+    each similarity_od being what label_section_to_patent_claim_similarity()
+    returns for that model, and combined_similarity_od is the fusion of all
+    similarity_od from combine_similarity_ods().
+
+    Every unique text is collected once and embedded once per model in
+    batches, so each additional model only adds its own inference.
+
+    If claim_vector_dtype is given, vectors are embedded and quantized a
+    chunk at a time with embed_texts_quantized() and scored with
+    label_section_to_patent_claim_similarity_quantized().  The float32
+    vectors used for re-scoring are written as {model_name}.npy to
+    vectors_dir, or to a temporary directory if vectors_dir is None, and
+    memory mapped instead of held in memory.  With fusion="mean", claims that
+    could be among the first or last claims of the weighted mean of the
+    quantized scores are also re-scored, so the first and last claims of
+    combined_similarity_od are the same as without quantization.  With
+    fusion="rank", models are fused on the ranks of their quantized
+    similarity_od, which are approximate apart from their first and last
+    claims.
+
+    If return_report is True, (model_similarity_od, combined_similarity_od,
+    report_od) is returned, wherein report_od is an OrderedDict of
+    {model_name: quantization_report(),...}, empty if claim_vector_dtype is
+    None.  The report scans every claim at full precision, so it is only
+    computed when asked for.
+
+    Parameters:
+        labels_section_od (OrderedDict): {section_title:section_text,...}
+        patent_od_no_dependency (OrderedDict): {patent_num: {claim_num:
+                                                [claim_text, ...], ..}, ...}
+        methods (OrderedDict): {model_name: model loaded by spaCy.load(),...}
+        weights (dict): {model_name: weight,...}; defaults to 1 for each model
+        fusion (string): "mean" or "rank"; see combine_similarity_ods()
+        batch_size (int): number of texts per batch
+        claim_vector_dtype (string): None, "float16" or "int8"
+        vectors_dir (string): directory to save float32 vectors in
+        return_report (bool): whether to also return report_od
+    '''
+    texts = collect_unique_texts(labels_section_od, patent_od_no_dependency)
+    text_index = {text: i for i, text in enumerate(texts)}
+
+    if claim_vector_dtype is None:
+        model_similarity_od = OrderedDict()
+        for model_name, vectors in embed_texts(texts, methods,
+                                               batch_size).items():
+            model_similarity_od[
+                model_name] = label_section_to_patent_claim_similarity_from_vectors(
+                    labels_section_od, patent_od_no_dependency, vectors,
+                    text_index)
+        report_od = OrderedDict()
+    else:
+        tmp_dir = None
+        if vectors_dir is None:
+            tmp_dir = tempfile.TemporaryDirectory()
+            vectors_dir = tmp_dir.name
+        try:
+            model_similarity_od, report_od = _quantized_model_similarity_ods(
+                labels_section_od, patent_od_no_dependency, texts,
+                text_index, methods, weights, fusion, claim_vector_dtype,
+                vectors_dir, batch_size, return_report)
+        finally:
+            if tmp_dir is not None:
+                tmp_dir.cleanup()
+
+    combined_similarity_od = combine_similarity_ods(model_similarity_od,
+                                                    weights, fusion)
+    if return_report:
+        return model_similarity_od, combined_similarity_od, report_od
+    return model_similarity_od, combined_similarity_od
+
+
+def _embed_claim_batch(claim_keys, claim_text_lists, text_index, method,
+                       batch_size):
+    '''
+    Returns (claim_keys, claim_bounds, claim_vectors), wherein claim_vectors
+    holds the L2 normalized vector of every alternative claim_text and
+    claim_bounds holds the [start, end) rows in claim_vectors of the
+    alternatives of each claim.
+
+    Parameters:
+        claim_keys (list): (patent_num, claim_num) of each claim
+        claim_text_lists (list): [claim_text, ...] of each claim
+        text_index (OrderedDict): {claim_text: row of claim_text,...}
+        method (object): the model loaded by spaCy.load()
+        batch_size (int): number of texts per batch
+    '''
+    vectors = _docs_to_unit_vectors(
+        method.pipe(list(text_index.keys()), batch_size=batch_size),
+        len(text_index))
+    claim_bounds = []
+    claim_rows = []
+    for claim_text_list in claim_text_lists:
+        start = len(claim_rows)
+        claim_rows.extend(text_index[text] for text in claim_text_list)
+        claim_bounds.append((start, len(claim_rows)))
+    return claim_keys, claim_bounds, vectors[claim_rows]
+
+
+def iter_claim_vector_batches(patents_no_dependency, method, batch_size=64):
+    '''
+    Yields (claim_keys, claim_bounds, claim_vectors) for consecutive batches
+    of about batch_size unique claim_texts, wherein claim_keys is a list of
+    (patent_num, claim_num), claim_vectors holds the L2 normalized vector of
+    every alternative claim_text of the batch and claim_bounds holds the
+    [start, end) rows in claim_vectors of the alternatives of each claim.
+    Patents are consumed only as far as needed to fill the next batch.
+
+    Parameters:
+        patents_no_dependency (iterable): (patent_num, {claim_num:
+                                          [claim_text, ...], ..}) for each
+                                          patent, for example from
+                                          iter_dependent_to_independent_claim()
+        method (object): the model loaded by spaCy.load()
+        batch_size (int): number of texts per batch
+    '''
+    claim_keys = []
+    claim_text_lists = []
+    # a dict is used as an insertion ordered set of the texts of the batch
+    text_index = OrderedDict()
+    for patent_num, claims_od in patents_no_dependency:
+        for claim_num, claim_text_list in claims_od.items():
+            claim_keys.append((patent_num, claim_num))
+            claim_text_lists.append(claim_text_list)
+            for claim_text in claim_text_list:
+                text_index.setdefault(claim_text, len(text_index))
+            if len(text_index) >= batch_size:
+                yield _embed_claim_batch(claim_keys, claim_text_lists,
+                                         text_index, method, batch_size)
+                claim_keys = []
+                claim_text_lists = []
+                text_index = OrderedDict()
+    if claim_keys:
+        yield _embed_claim_batch(claim_keys, claim_text_lists, text_index,
+                                 method, batch_size)
+
+
+def _push_bounded(heap, entry, k):
+    '''
+    Pushes entry onto heap, dropping the smallest entry so that heap keeps the
+    k largest entries.
+
+    Parameters:
+        heap (list): heap of entries
+        entry (tuple): entry to push
+        k (int): maximum number of entries in heap
+    '''
+    if len(heap) < k:
+        heapq.heappush(heap, entry)
+    else:
+        heapq.heappushpop(heap, entry)
+
+
+def stream_label_section_to_patent_claim_similarity(labels_section_od,
+                                                    patents_no_dependency,
+                                                    method,
+                                                    k=3,
+                                                    batch_size=64):
+    '''
+    Returns OrderedDict of {section_title:[(patent_num, claim_num,
+    similarity_score),...],...} listing the k most similar followed by the k
+    least similar claims for each label section, sorted and scored as in
+    label_section_to_patent_claim_similarity_from_vectors().  If there are
+    no more than 2 * k claims, every claim is listed, so pretty_print_best()
+    prints the same as for the batch functions when k is 3.
+
+    patents_no_dependency is consumed as a stream: parsing, expansion of
+    dependent claims, embedding and scoring proceed one batch of claims at a
+    time, and only the running top and bottom k of each section are kept, so
+    memory does not grow with the number of patents.  For example, for a
+    bulk patent file:
+
+        patents_no_dependency = iter_dependent_to_independent_claim(
+            iter_bulk_patent_file("ipg121009.xml"))
+
+    Parameters:
+        labels_section_od (OrderedDict): {section_title:section_text,...}
+        patents_no_dependency (iterable): (patent_num, {claim_num:
+                                          [claim_text, ...], ..}) for each
+                                          patent
+        method (object): the model loaded by spaCy.load()
+        k (int): number of most and least similar claims to keep
+        batch_size (int): number of texts per batch
+    '''
+    titles = [title for title, text in labels_section_od.items() if text]
+    section_vectors = _docs_to_unit_vectors(
+        method.pipe([labels_section_od[title] for title in titles],
+                    batch_size=batch_size), len(titles))
+
+    # the similarity list is sorted by descending (similarity, -seq), seq
+    # being the position of the claim in the stream; top_heaps keep the k
+    # largest (similarity, -seq, patent_num, claim_num) and bottom_heaps the
+    # k smallest as (-similarity, seq, patent_num, claim_num)
+    top_heaps = [[] for _ in titles]
+    bottom_heaps = [[] for _ in titles]
+    seq = 0
+    for claim_keys, claim_bounds, claim_vectors in iter_claim_vector_batches(
+            patents_no_dependency, method, batch_size):
+        starts = np.array([start for start, _ in claim_bounds], dtype=np.intp)
+        nonempty = np.array([end > start for start, end in claim_bounds],
+                            dtype=bool)
+        # similarities of shape (number of claims, number of sections); a
+        # batch of claims without alternatives has no vectors to multiply,
+        # and its claims score 0 as in the batch functions
+        if len(claim_vectors) and len(titles):
+            products = claim_vectors @ section_vectors.T
+        else:
+            products = np.zeros((len(claim_vectors), len(titles)),
+                                dtype=np.float32)
+        similarities = _claim_max(products, starts, nonempty)
+        for j, (top_heap, bottom_heap) in enumerate(zip(top_heaps,
+                                                         bottom_heaps)):
+            if k <= 0:
+                break
+            column = similarities[:, j]
+            # skip claims that cannot enter a full heap
+            candidates = np.ones(len(column), dtype=bool)
+            if len(top_heap) == k and len(bottom_heap) == k:
+                candidates = (column > top_heap[0][0]) | (column <=
+                                                          -bottom_heap[0][0])
+            for i in np.flatnonzero(candidates):
+                similarity = float(column[i])
+                patent_num, claim_num = claim_keys[i]
+                _push_bounded(top_heap,
+                              (similarity, -(seq + i), patent_num, claim_num),
+                              k)
+                _push_bounded(bottom_heap,
+                              (-similarity, seq + i, patent_num, claim_num), k)
+        seq += len(claim_keys)
+
+    return_od = OrderedDict()
+    for title in labels_section_od.keys():
+        return_od[title] = []
+    for title, top_heap, bottom_heap in zip(titles, top_heaps, bottom_heaps):
+        # {seq: (patent_num, claim_num, similarity_score)}
+        kept = {}
+        for similarity, neg_seq, patent_num, claim_num in top_heap:
+            kept[-neg_seq] = (patent_num, claim_num, similarity)
+        for neg_similarity, claim_seq, patent_num, claim_num in bottom_heap:
+            kept[claim_seq] = (patent_num, claim_num, -neg_similarity)
+        return_od[title] = [
+            kept[claim_seq]
+            for claim_seq in sorted(kept, key=lambda x: (-kept[x][2], x))
+        ]
+    return return_od
+
+
 def pretty_print_best(label_sections_od, patent_od, similarity_od):
     """
     Prints out the best claim that matches each section of the label
@@ -112,6 +1197,17 @@ def pretty_print_best(label_sections_od, patent_od, similarity_od):
 
 
 if __name__ == '__main__':
+    import scispacy
+    import spacy
+    from orange_book import connect, resolve_patent_files
+
+    # OrderedDict of {model_name: model loaded by spaCy.load(),...}
+    methods = OrderedDict()
+    methods["en_core_sci_lg"] = spacy.load(
+        "en_core_sci_lg-0.4.0/en_core_sci_lg/en_core_sci_lg-0.4.0")
+    # removing bert for the time being; this pretrained model is very slow.
+    # methods["en_core_sci_scibert"] = spacy.load(
+    #     "en_core_sci_scibert-0.4.0/en_core_sci_scibert/en_core_sci_scibert-0.4.0/")
 
     # OrderedDict of {section_title:section_text,...}
     label_sections_od = read_label("data/label/2007-05-04.xml")
@@ -122,22 +1218,52 @@ if __name__ == '__main__':
     # OrderedDict of {patent_num: {claim_num:[claim_text,...],..},...}
     patent_od_no_dependency = OrderedDict()
 
-    patent_files = ['8282966.xml', '8293284.xml', '8431163.xml']
+    # patents of Inomax (NDA 020845) from the Orange Book store built by
+    # orange_book.py, if it exists and lists them
+    patent_files = []
+    if os.path.exists("orange_book.db"):
+        conn = connect("orange_book.db")
+        try:
+            patent_files = resolve_patent_files(conn, ["020845"])["020845"]
+        finally:
+            conn.close()
+        if not patent_files:
+            print("No patent files of NDA 020845 in orange_book.db; "
+                  "using the default patent files")
+    if not patent_files:
+        patent_files = [
+            "data/patent/8282966.xml", "data/patent/8293284.xml",
+            "data/patent/8431163.xml"
+        ]
     for patent_file in patent_files:
-        patent_num = patent_file[:-4]
-        patent_od[patent_num] = read_patent("data/patent/" + patent_file)
+        patent_num = os.path.basename(patent_file)[:-4]
+        patent_od[patent_num] = read_patent(patent_file)
         patent_od_no_dependency[patent_num] = read_patent_no_dependency(
-            "data/patent/" + patent_file)
+            patent_file)
+
+    # set to "float16" or "int8" to keep claim vectors quantized in memory
+    claim_vector_dtype = None
 
     # similarity scores in OrderedDict of {section_title:[(patent_num,
-    # claim_num, similarity_score),...],...} using en_core_sci_lg model
-    similarity_od = label_section_to_patent_claim_similarity(
-        label_sections_od, patent_od_no_dependency, en_core_sci_lg_nlp)
-    print("===Most Similar Claim Selected Using en_core_sci_lg Model===")
-    pretty_print_best(label_sections_od, patent_od, similarity_od)
-
-    # # similar scores in OrderedDict selected using en_core_sci_scibert model
-    # similarity_od = label_section_to_patent_claim_similarity(
-    #     label_sections_od, patent_od_no_dependency, en_core_sci_scibert_nlp)
-    # print("===Most Similar Claim Selected Using en_core_sci_scibert Model===")
-    # pretty_print_best(label_sections_od, patent_od, similarity_od)
+    # claim_num, similarity_score),...],...} for each model, all texts being
+    # embedded once per model
+    model_similarity_od, combined_similarity_od, report_od = \
+        ensemble_label_section_to_patent_claim_similarity(
+            label_sections_od, patent_od_no_dependency, methods,
+            claim_vector_dtype=claim_vector_dtype, return_report=True)
+    for model_name, similarity_od in model_similarity_od.items():
+        print("===Most Similar Claim Selected Using " + model_name +
+              " Model===")
+        pretty_print_best(label_sections_od, patent_od, similarity_od)
+
+    if len(methods) > 1:
+        print("===Most Similar Claim Selected Using Combined Models===")
+        pretty_print_best(label_sections_od, patent_od,
+                          combined_similarity_od)
+
+    # memory and ranking accuracy of quantized vectors, if claim_vector_dtype
+    # is set
+    for model_name, report in report_od.items():
+        print("===Quantization Report Using " + model_name + " Model===")
+        for key, value in report.items():
+            print(key + ": " + str(value))
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from load_file import read_patent, get_patent_num, iter_patent_files, iter_bulk_patent_file
+
+
+class CountingLines:
+    """ Stand-in for a file opened by open() that records each line read """
+    def __init__(self, lines, read_lines):
+        self.lines = lines
+        self.read_lines = read_lines
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def __iter__(self):
+        for line in self.lines:
+            self.read_lines.append(line)
+            yield line
+
+
+class Test_load_file(unittest.TestCase):
+
+    patent_files = [
+        "data/patent/8282966.xml", "data/patent/8293284.xml",
+        "data/patent/8431163.xml"
+    ]
+
+    def test_get_patent_num(self):
+        """ Ensure that get_patent_num reads the publication number
+        """
+        with open(self.patent_files[0], "r") as file:
+            self.assertEqual(get_patent_num(file.read()), "8282966")
+        self.assertEqual(get_patent_num("<claims></claims>"), None)
+
+    def test_iter_bulk_patent_file(self):
+        """ Ensure that iter_bulk_patent_file yields each patent of a bulk
+        file like read_patent, reading only as far as the patent yielded
+        """
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            bulk_file = os.path.join(tmp_dir, "bulk.xml")
+            with open(bulk_file, "w") as bulk:
+                for patent_file in self.patent_files:
+                    with open(patent_file, "r") as file:
+                        content = file.read()
+                    if not content.startswith("<?xml"):
+                        content = '<?xml version="1.0" encoding="UTF-8"?>\n' + content
+                    bulk.write(content.rstrip("\n") + "\n")
+
+            expected = list(iter_patent_files(self.patent_files))
+            self.assertEqual([patent_num for patent_num, _ in expected],
+                             ["8282966", "8293284", "8431163"])
+            self.assertEqual(list(iter_bulk_patent_file(bulk_file)), expected)
+
+            # the first patent is yielded after reading no further than the
+            # first line of the second patent
+            with open(bulk_file, "r") as file:
+                lines = file.readlines()
+            first_lines = [
+                i for i, line in enumerate(lines) if line.startswith("<?xml")
+            ]
+            read_lines = []
+            with mock.patch("load_file.open",
+                            return_value=CountingLines(lines, read_lines),
+                            create=True):
+                patents = iter_bulk_patent_file(bulk_file)
+                self.assertEqual(next(patents), expected[0])
+                self.assertEqual(len(read_lines), first_lines[1] + 1)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
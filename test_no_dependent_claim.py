@@ -1,5 +1,5 @@
 import unittest
-from no_dependent_claim import drop_claim_number, drop_reference_numbers, get_parent_claim, dependent_to_independent_claim
+from no_dependent_claim import drop_claim_number, drop_reference_numbers, get_parent_claim, dependent_to_independent_claim, iter_dependent_to_independent_claim
 import copy
 
 
@@ -244,6 +244,16 @@ class Test_no_dependent_claim(unittest.TestCase):
             self.assertEqual(independent_claims[i],
                              claims_no_dependent_combined[i])
 
+    def test_iter_dependent_to_independent_claim(self):
+        """ Ensure that iter_dependent_to_independent_claim expands each
+        patent of a stream like dependent_to_independent_claim
+        """
+        patents = iter([("111", self.claims_clean), ("222", {})])
+        self.assertEqual(list(iter_dependent_to_independent_claim(patents)),
+                         [("111",
+                           dependent_to_independent_claim(self.claims_clean)),
+                          ("222", {})])
+
 
 if __name__ == '__main__':
     unittest.main()
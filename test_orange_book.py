@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+import unittest
+from orange_book import normalize_appl_no, normalize_patent_no, load_orange_book, find_products, find_patents, find_exclusivities, resolve_patent_files, resolve_label_files
+
+
+class Test_orange_book(unittest.TestCase):
+
+    products = (
+        "Ingredient~DF;Route~Trade_Name~Applicant~Strength~Appl_Type~Appl_No~Product_No~TE_Code~Approval_Date~RLD~RS~Type~Applicant_Full_Name\n"
+        "NITRIC OXIDE~GAS;INHALATION~INOMAX~MALLINCKRODT HOSP~800PPM~N~020845~003~AA~Dec 23, 1999~Yes~Yes~RX~MALLINCKRODT HOSP PRODUCTS IP LTD\n"
+        "NITRIC OXIDE~GAS;INHALATION~INOMAX~MALLINCKRODT HOSP~100PPM~N~020845~002~AA~Dec 23, 1999~Yes~No~RX~MALLINCKRODT HOSP PRODUCTS IP LTD\n"
+        '"QUOTED" INGREDIENT~GAS;INHALATION~QUOTED~APPLICANT~1PPM~N~099999~001~~Jan 1, 2000~No~No~RX~APPLICANT\n'
+        "ABACAVIR SULFATE; LAMIVUDINE~TABLET;ORAL~EPZICOM~VIIV HLTHCARE~EQ 600MG BASE;300MG~N~021652~001~AB~Aug 2, 2004~Yes~Yes~RX~VIIV HEALTHCARE CO\n"
+    )
+
+    patent = (
+        "Appl_Type~Appl_No~Product_No~Patent_No~Patent_Expire_Date_Text~Drug_Substance_Flag~Drug_Product_Flag~Patent_Use_Code~Delist_Flag~Submission_Date\n"
+        "N~020845~003~8431163~Jun 30, 2029~~~U-1~~Jun 3, 2013\n"
+        "N~020845~003~8282966~Jun 30, 2029~~~U-1~~Nov 8, 2012\n"
+        "N~020845~002~8293284~Jun 30, 2029~~~U-1~~Nov 26, 2012\n"
+        "N~020845~002~8293284*PED~Dec 30, 2029~~~U-1~~\n"
+        "N~021652~001~6417191~Mar 28, 2016~Y~Y~~~\n"
+    )
+
+    exclusivity = ("Appl_Type~Appl_No~Product_No~Exclusivity_Code~Exclusivity_Date\n"
+                   "N~020845~003~PED~Dec 30, 2029\n")
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        file_names = []
+        for name in ("products", "patent", "exclusivity"):
+            file_name = os.path.join(self.tmp_dir, name + ".txt")
+            with open(file_name, "w") as file:
+                file.write(getattr(self, name))
+            file_names.append(file_name)
+        self.conn = load_orange_book(os.path.join(self.tmp_dir, "ob.db"),
+                                     *file_names)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_normalize(self):
+        """ Ensure that application and patent numbers are normalized
+        """
+        self.assertEqual(normalize_appl_no("NDA20845"), "020845")
+        self.assertEqual(normalize_appl_no(20845), "020845")
+        self.assertEqual(normalize_patent_no("US 8,431,163 B2"), "8431163")
+        self.assertEqual(normalize_patent_no("8293284*PED"), "8293284")
+        self.assertEqual(normalize_patent_no("RE39502"), "RE39502")
+
+    def test_lookups(self):
+        """ Ensure that lookups by application number, product number,
+        ingredient and patent number work
+        """
+        self.assertEqual(len(find_products(self.conn, appl_no="20845")), 2)
+        self.assertEqual(
+            find_products(self.conn, appl_no="020845",
+                          product_no=3)[0]["strength"], "800PPM")
+        self.assertEqual(
+            len(find_products(self.conn, ingredient="nitric oxide")), 2)
+        self.assertEqual(
+            find_products(self.conn, ingredient="LAMIVUDINE")[0]["trade_name"],
+            "EPZICOM")
+        self.assertEqual(
+            find_products(self.conn, appl_no="099999")[0]["ingredient"],
+            '"QUOTED" INGREDIENT')
+        self.assertEqual(
+            [row["product_no"] for row in find_patents(self.conn,
+                                                       patent_no="8293284")],
+            ["002", "002"])
+        self.assertEqual(len(find_patents(self.conn, appl_no="020845")), 4)
+        self.assertEqual(
+            find_exclusivities(self.conn,
+                               appl_no="020845")[0]["exclusivity_code"], "PED")
+
+    def test_resolve_patent_files(self):
+        """ Ensure that patent files are resolved for a batch of application
+        numbers, skipping patents without a file in data/patent/
+        """
+        self.assertEqual(
+            resolve_patent_files(self.conn, ["020845", "021652", "999999"]), {
+                "020845": [
+                    os.path.join("data/patent", "8282966.xml"),
+                    os.path.join("data/patent", "8293284.xml"),
+                    os.path.join("data/patent", "8431163.xml"),
+                ],
+                "021652": [],
+                "999999": [],
+            })
+        self.assertFalse(self.conn.in_transaction)
+
+    def test_reload(self):
+        """ Ensure that loading again replaces the rows and recreates the
+        indexes without leaving a transaction open
+        """
+        self.conn.close()
+        self.conn = load_orange_book(
+            os.path.join(self.tmp_dir, "ob.db"),
+            *[os.path.join(self.tmp_dir, name + ".txt")
+              for name in ("products", "patent", "exclusivity")])
+        self.assertFalse(self.conn.in_transaction)
+        self.assertEqual(len(find_patents(self.conn, appl_no="020845")), 4)
+        indexes = [
+            row[0] for row in self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'")
+        ]
+        self.assertIn("patents_patent_no", indexes)
+        resolve_label_files(self.conn, ["020845"])
+        self.assertFalse(self.conn.in_transaction)
+
+    def test_resolve_label_files(self):
+        """ Ensure that every version of a label is resolved, including
+        versions which do not recite the application number
+        """
+        label_files = resolve_label_files(self.conn, ["NDA020845",
+                                                      "021652"])
+        self.assertEqual(label_files["021652"], [])
+        versions = [
+            int(path.split(os.sep)[-3]) for path in label_files["020845"]
+        ]
+        self.assertEqual(versions, [1, 2, 3, 4, 6, 7, 9, 12, 13, 14])
+
+
+if __name__ == '__main__':
+    unittest.main()
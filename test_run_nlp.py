@@ -0,0 +1,480 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from collections import OrderedDict
+import numpy as np
+import spacy
+from spacy.language import Language
+from run_nlp import embed_texts, _iter_model_doc_batches, _docs_to_unit_vectors, label_section_to_patent_claim_similarity, collect_unique_texts, ensemble_label_section_to_patent_claim_similarity, combine_similarity_ods, label_section_to_patent_claim_similarity_from_vectors, quantize_vectors, label_section_to_patent_claim_similarity_quantized, quantization_report, stream_label_section_to_patent_claim_similarity
+
+
+class FakeDoc:
+    """ Stand-in for a spaCy Doc holding only a vector """
+    def __init__(self, vector):
+        self.vector = np.asarray(vector, dtype=np.float32)
+
+    def similarity(self, other):
+        norm = np.linalg.norm(self.vector) * np.linalg.norm(other.vector)
+        if not norm:
+            return 0.0
+        return float(np.dot(self.vector, other.vector) / norm)
+
+
+class FakeModel:
+    """ Stand-in for a model loaded by spaCy.load() that embeds each text
+    with a fixed vector and counts the texts it embeds
+    """
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.texts_embedded = []
+
+    def __call__(self, text):
+        self.texts_embedded.append(text)
+        return FakeDoc(self.vectors[text])
+
+    def pipe(self, texts, batch_size=64):
+        for text in texts:
+            yield self(text)
+
+
+class CountingTokenizer:
+    """ Wraps a spaCy tokenizer and records the texts it tokenizes """
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.texts = []
+
+    def __call__(self, text):
+        self.texts.append(text)
+        return self.tokenizer(text)
+
+    def pipe(self, texts, batch_size=64):
+        for text in texts:
+            yield self(text)
+
+    def to_bytes(self, **kwargs):
+        return self.tokenizer.to_bytes(**kwargs)
+
+
+@Language.factory("test_token_vectors", default_config={"seed": 0})
+def create_token_vectors(nlp, name, seed):
+    """ Returns a pipeline component setting doc.tensor to a fixed vector for
+    each token text, which differs for each seed
+    """
+    def token_vectors(doc):
+        doc.tensor = np.array([
+            np.random.default_rng([seed] + [ord(c) for c in token.text
+                                            ]).normal(size=4)
+            for token in doc
+        ], dtype=np.float32)
+        return doc
+
+    return token_vectors
+
+
+def blank_model(seed):
+    """ Returns a blank spaCy model with a test_token_vectors component and a
+    CountingTokenizer
+    """
+    nlp = spacy.blank("en")
+    nlp.add_pipe("test_token_vectors", config={"seed": seed})
+    nlp.tokenizer = CountingTokenizer(nlp.tokenizer)
+    return nlp
+
+
+class Test_run_nlp(unittest.TestCase):
+
+    label_sections_od = OrderedDict([
+        ("INDICATIONS", "section a"),
+        ("TABLE", ""),
+        ("WARNINGS", "section b"),
+    ])
+
+    patent_od_no_dependency = OrderedDict([
+        ("111", OrderedDict([
+            (1, ["claim x"]),
+            (2, ["claim x claim y", "claim x claim z"]),
+        ])),
+        ("222", OrderedDict([
+            (1, ["claim y"]),
+            (2, ["claim x"]),
+        ])),
+    ])
+
+    vectors_1 = {
+        "section a": [1, 0, 0],
+        "section b": [0, 1, 0],
+        "claim x": [1, 0.2, 0],
+        "claim x claim y": [0, 1, 0.1],
+        "claim x claim z": [0.5, 0.5, 0],
+        "claim y": [-1, 0, 1],
+    }
+
+    vectors_2 = {
+        "section a": [0, 0, 1],
+        "section b": [1, 1, 0],
+        "claim x": [0, 1, 0],
+        "claim x claim y": [0, 0.3, 1],
+        "claim x claim z": [1, 0, 0],
+        "claim y": [1, 1, 0.1],
+    }
+
+    def assertSimilarityOdEqual(self, first, second):
+        self.assertEqual(list(first.keys()), list(second.keys()))
+        for title in first.keys():
+            self.assertEqual([item[:2] for item in first[title]],
+                             [item[:2] for item in second[title]])
+            for item1, item2 in zip(first[title], second[title]):
+                self.assertAlmostEqual(item1[2], item2[2], places=5)
+
+    def test_collect_unique_texts(self):
+        """ Ensure that collect_unique_texts lists each non-empty text once
+        """
+        self.assertEqual(
+            collect_unique_texts(self.label_sections_od,
+                                 self.patent_od_no_dependency), [
+                                     "section a", "section b", "claim x",
+                                     "claim x claim y", "claim x claim z",
+                                     "claim y"
+                                 ])
+
+    def test_ensemble_matches_single_model(self):
+        """ Ensure that each per-model result of
+        ensemble_label_section_to_patent_claim_similarity matches
+        label_section_to_patent_claim_similarity, and that each unique text
+        is embedded once per model
+        """
+        methods = OrderedDict([("model_1", FakeModel(self.vectors_1)),
+                               ("model_2", FakeModel(self.vectors_2))])
+        model_similarity_od, _ = \
+            ensemble_label_section_to_patent_claim_similarity(
+                self.label_sections_od, self.patent_od_no_dependency,
+                methods)
+
+        self.assertEqual(list(model_similarity_od.keys()),
+                         ["model_1", "model_2"])
+        for model_name, method in methods.items():
+            self.assertEqual(sorted(method.texts_embedded),
+                             sorted(set(method.texts_embedded)))
+            expected = label_section_to_patent_claim_similarity(
+                self.label_sections_od, self.patent_od_no_dependency,
+                FakeModel(method.vectors))
+            self.assertSimilarityOdEqual(model_similarity_od[model_name],
+                                         expected)
+
+    def test_combine_similarity_ods_mean(self):
+        """ Ensure that combine_similarity_ods computes a weighted mean
+        """
+        similarity_ods = OrderedDict([
+            ("model_1", OrderedDict([("A", [("1", 1, 0.9), ("1", 2, 0.1)])])),
+            ("model_2", OrderedDict([("A", [("1", 2, 0.8), ("1", 1, 0.0)])])),
+        ])
+        combined = combine_similarity_ods(similarity_ods,
+                                          weights={"model_2": 3})
+        self.assertSimilarityOdEqual(
+            combined,
+            OrderedDict([("A", [("1", 2, 0.625), ("1", 1, 0.225)])]))
+
+    def test_combine_similarity_ods_rank(self):
+        """ Ensure that combine_similarity_ods computes reciprocal rank fusion
+        """
+        similarity_ods = OrderedDict([
+            ("model_1", OrderedDict([("A", [("1", 1, 0.9), ("1", 2, 0.1)])])),
+            ("model_2", OrderedDict([("A", [("1", 2, 0.8), ("1", 1, 0.0)])])),
+        ])
+        combined = combine_similarity_ods(similarity_ods,
+                                          weights={"model_2": 2},
+                                          fusion="rank",
+                                          rrf_k=0)
+        self.assertSimilarityOdEqual(
+            combined,
+            OrderedDict([("A", [("1", 2, 2.5), ("1", 1, 2.0)])]))
+
+        with self.assertRaises(ValueError):
+            combine_similarity_ods(similarity_ods, fusion="median")
+        with self.assertRaises(ValueError):
+            combine_similarity_ods(similarity_ods,
+                                   weights={
+                                       "model_1": 0,
+                                       "model_2": 0
+                                   })
+        with self.assertRaises(ValueError):
+            combine_similarity_ods(similarity_ods, weights={"model_1": -1})
+
+    def test_embed_texts_shared_tokenizer(self):
+        """ Ensure that embed_texts tokenizes texts once for models sharing a
+        tokenizer, and that the vectors match those of method.pipe
+        """
+        methods = OrderedDict([("model_1", blank_model(1)),
+                               ("model_2", blank_model(2))])
+        texts = ["Inhaled nitric oxide.", "A method of treating  a child."]
+        vectors_od = embed_texts(texts, methods)
+
+        self.assertEqual(methods["model_1"].tokenizer.texts, texts)
+        self.assertEqual(methods["model_2"].tokenizer.texts, [])
+        self.assertEqual(list(vectors_od.keys()), ["model_1", "model_2"])
+        self.assertFalse(
+            np.allclose(vectors_od["model_1"], vectors_od["model_2"]))
+        for model_name, method in methods.items():
+            expected = _docs_to_unit_vectors(method.pipe(texts), len(texts))
+            np.testing.assert_allclose(vectors_od[model_name], expected)
+
+    def test_model_doc_batches_tokenize_per_batch(self):
+        """ Ensure that texts are tokenized one batch at a time for models
+        sharing a tokenizer, rather than all before any model runs
+        """
+        methods = OrderedDict([("model_1", blank_model(1)),
+                               ("model_2", blank_model(2))])
+        texts = ["text %d" % i for i in range(5)]
+        tokenizer = methods["model_1"].tokenizer
+        starts = []
+        for start, docs_od in _iter_model_doc_batches(texts, methods, 2):
+            starts.append(start)
+            self.assertEqual(tokenizer.texts, texts[:start + 2])
+            self.assertEqual(list(docs_od.keys()), ["model_1", "model_2"])
+            for docs in docs_od.values():
+                self.assertEqual([doc.text for doc in docs],
+                                 texts[start:start + 2])
+        self.assertEqual(starts, [0, 2, 4])
+
+    def random_vectors_and_claims(self, seed=0, width=50):
+        """ Returns (labels_section_od, patent_od_no_dependency, vectors,
+        text_index) for random unit vectors
+        """
+        rng = np.random.default_rng(seed)
+        labels_section_od = OrderedDict(
+            ("section %d" % i, "section text %d" % i) for i in range(5))
+        patent_od_no_dependency = OrderedDict()
+        for patent in range(20):
+            patent_od_no_dependency[str(patent)] = OrderedDict(
+                (claim, [
+                    "claim text %d %d %d" % (patent, claim, alternative)
+                    for alternative in range(claim % 3 + 1)
+                ]) for claim in range(1, 16))
+        texts = collect_unique_texts(labels_section_od,
+                                     patent_od_no_dependency)
+        text_index = {text: i for i, text in enumerate(texts)}
+        vectors = rng.normal(size=(len(texts), width)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1)[:, None]
+        return labels_section_od, patent_od_no_dependency, vectors, text_index
+
+    def test_quantize_vectors(self):
+        """ Ensure that quantize_vectors bounds the error of each vector
+        """
+        _, _, vectors, _ = self.random_vectors_and_claims()
+        for dtype in ("float16", "int8"):
+            quantized, scales, errors = quantize_vectors(vectors, dtype)
+            self.assertEqual(quantized.dtype, np.dtype(dtype))
+            restored = quantized.astype(np.float32)
+            if scales is not None:
+                restored *= scales[:, None]
+            np.testing.assert_allclose(
+                np.linalg.norm(vectors - restored, axis=1), errors,
+                atol=1e-6)
+
+        with self.assertRaises(ValueError):
+            quantize_vectors(vectors, "int4")
+
+    def test_quantized_matches_full_precision(self):
+        """ Ensure that the first and last 3 claims of
+        label_section_to_patent_claim_similarity_quantized and their scores
+        are exactly those of
+        label_section_to_patent_claim_similarity_from_vectors
+        """
+        for seed in range(5):
+            for width in (8, 50):
+                labels_section_od, patent_od_no_dependency, vectors, \
+                    text_index = self.random_vectors_and_claims(seed, width)
+                expected = \
+                    label_section_to_patent_claim_similarity_from_vectors(
+                        labels_section_od, patent_od_no_dependency, vectors,
+                        text_index)
+                for dtype in ("float16", "int8"):
+                    result = \
+                        label_section_to_patent_claim_similarity_quantized(
+                            labels_section_od, patent_od_no_dependency,
+                            quantize_vectors(vectors, dtype), vectors,
+                            text_index)
+                    for title in labels_section_od.keys():
+                        self.assertEqual(len(result[title]),
+                                         len(expected[title]))
+                        self.assertEqual(result[title][:3],
+                                         expected[title][:3])
+                        self.assertEqual(result[title][-3:],
+                                         expected[title][-3:])
+
+    def test_quantization_report(self):
+        """ Ensure that quantization_report reports memory and accuracy
+        """
+        labels_section_od, patent_od_no_dependency, vectors, text_index = \
+            self.random_vectors_and_claims()
+        report = quantization_report(labels_section_od,
+                                     patent_od_no_dependency,
+                                     quantize_vectors(vectors, "int8"),
+                                     vectors, text_index)
+        self.assertEqual(report["float32_bytes_per_million"], 200000000)
+        self.assertEqual(report["quantized_bytes_per_million"], 58000000)
+        self.assertTrue(0 <= report["top_k_recall"] <= 1)
+        self.assertTrue(0 <= report["bottom_k_recall"] <= 1)
+        self.assertTrue(0 < report["max_score_error"] < 0.05)
+        self.assertTrue(0 < report["rescored_fraction"] <= 1)
+
+    def test_ensemble_quantized_matches_full_precision(self):
+        """ Ensure that the first and last 3 claims of each model, and of the
+        mean of the models, of
+        ensemble_label_section_to_patent_claim_similarity with
+        claim_vector_dtype and their scores are exactly the same as without,
+        and that the float32 vectors are written to vectors_dir
+        """
+        for seed in range(10):
+            labels_section_od, patent_od_no_dependency, vectors_1, \
+                text_index = self.random_vectors_and_claims(seed, 8)
+            vectors_2 = self.random_vectors_and_claims(seed + 100, 8)[2]
+            methods = OrderedDict([
+                ("model_1",
+                 FakeModel({text: vectors_1[i]
+                            for text, i in text_index.items()})),
+                ("model_2",
+                 FakeModel({text: vectors_2[i]
+                            for text, i in text_index.items()})),
+            ])
+            for fusion in ("mean", "rank"):
+                expected = ensemble_label_section_to_patent_claim_similarity(
+                    labels_section_od,
+                    patent_od_no_dependency,
+                    methods,
+                    fusion=fusion)
+                for dtype in ("float16", "int8"):
+                    tmp_dir = tempfile.mkdtemp()
+                    try:
+                        with mock.patch("run_nlp._QUANTIZE_CHUNK_SIZE", 50):
+                            result = \
+                                ensemble_label_section_to_patent_claim_similarity(
+                                    labels_section_od,
+                                    patent_od_no_dependency,
+                                    methods,
+                                    fusion=fusion,
+                                    claim_vector_dtype=dtype,
+                                    vectors_dir=tmp_dir,
+                                    return_report=True)
+                        np.testing.assert_allclose(
+                            np.load(os.path.join(tmp_dir, "model_1.npy")),
+                            vectors_1,
+                            atol=1e-6)
+                    finally:
+                        shutil.rmtree(tmp_dir)
+                    self.assertEqual(list(result[2].keys()),
+                                     ["model_1", "model_2"])
+                    pairs = [(expected[0][model_name], result[0][model_name])
+                             for model_name in methods]
+                    # ranks of the quantized scores are only approximate
+                    if fusion == "mean":
+                        pairs.append((expected[1], result[1]))
+                    for expected_od, result_od in pairs:
+                        for title in labels_section_od.keys():
+                            self.assertEqual(result_od[title][:3],
+                                             expected_od[title][:3])
+                            self.assertEqual(result_od[title][-3:],
+                                             expected_od[title][-3:])
+                    for title in labels_section_od.keys():
+                        self.assertEqual(
+                            sorted(item[:2] for item in result[1][title]),
+                            sorted(item[:2] for item in expected[1][title]))
+
+        # a temporary directory is used if vectors_dir is not given, and no
+        # report is computed unless asked for
+        with mock.patch("run_nlp.quantization_report") as report:
+            result = ensemble_label_section_to_patent_claim_similarity(
+                labels_section_od,
+                patent_od_no_dependency,
+                methods,
+                claim_vector_dtype="int8")
+        self.assertEqual(len(result), 2)
+        report.assert_not_called()
+
+    def test_stream_matches_batch(self):
+        """ Ensure that stream_label_section_to_patent_claim_similarity keeps
+        the same first and last k claims as
+        label_section_to_patent_claim_similarity_from_vectors, including ties
+        """
+        labels_section_od, patent_od_no_dependency, vectors, text_index = \
+            self.random_vectors_and_claims()
+        labels_section_od["TABLE"] = ""
+        expected = label_section_to_patent_claim_similarity_from_vectors(
+            labels_section_od, patent_od_no_dependency, vectors, text_index)
+        method = FakeModel(
+            {text: vectors[i] for text, i in text_index.items()})
+        for k in (3, 5):
+            result = stream_label_section_to_patent_claim_similarity(
+                labels_section_od,
+                iter(patent_od_no_dependency.items()),
+                method,
+                k=k,
+                batch_size=7)
+            self.assertEqual(result["TABLE"], [])
+            for title in labels_section_od.keys():
+                self.assertSimilarityOdEqual(
+                    OrderedDict([(title, result[title])]),
+                    OrderedDict([
+                        (title, expected[title][:k] + expected[title][-k:])
+                    ]) if expected[title] else OrderedDict([(title, [])]))
+
+        # every claim is listed when there are no more than 2 * k claims
+        result = stream_label_section_to_patent_claim_similarity(
+            labels_section_od, iter(patent_od_no_dependency.items()), method,
+            k=150)
+        self.assertSimilarityOdEqual(result, expected)
+
+        # a batch of claims without alternatives scores 0 as in the batch
+        # functions
+        patents = [("empty", OrderedDict([(1, []), (2, [])]))
+                   ] + list(patent_od_no_dependency.items())
+        result = stream_label_section_to_patent_claim_similarity(
+            labels_section_od, iter(patents), method, batch_size=7)
+        expected = label_section_to_patent_claim_similarity_from_vectors(
+            labels_section_od, OrderedDict(patents), vectors, text_index)
+        for title in labels_section_od.keys():
+            self.assertSimilarityOdEqual(
+                OrderedDict([(title, result[title])]),
+                OrderedDict([(title, expected[title][:3] +
+                              expected[title][-3:])]))
+        result = stream_label_section_to_patent_claim_similarity(
+            labels_section_od, iter(patents[:1]), method)
+        self.assertEqual(result["section 0"], [("empty", 1, 0.0),
+                                               ("empty", 2, 0.0)])
+
+
+    def test_stream_consumes_patents_per_batch(self):
+        """ Ensure that stream_label_section_to_patent_claim_similarity only
+        pulls patents from the stream as each batch of claims fills, rather
+        than reading the whole stream first
+        """
+        labels_section_od, patent_od_no_dependency, vectors, text_index = \
+            self.random_vectors_and_claims()
+        consumed = []
+
+        def patents():
+            for patent_num, claims_od in patent_od_no_dependency.items():
+                consumed.append(patent_num)
+                yield patent_num, claims_od
+
+        method = FakeModel(
+            {text: vectors[i] for text, i in text_index.items()})
+        pipe = method.pipe
+        consumed_at_pipe = []
+
+        def counting_pipe(texts, batch_size=64):
+            consumed_at_pipe.append(len(consumed))
+            return pipe(texts, batch_size)
+
+        method.pipe = counting_pipe
+        # each patent has 30 claim_texts, so each batch of 30 texts is
+        # embedded right after its own patent is consumed
+        stream_label_section_to_patent_claim_similarity(
+            labels_section_od, patents(), method, batch_size=30)
+        self.assertEqual(consumed_at_pipe, [0] + list(range(1, 21)))
+
+
+if __name__ == '__main__':
+    unittest.main()